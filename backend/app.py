@@ -1,15 +1,21 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 from flask_jwt_extended import (
     JWTManager, create_access_token, create_refresh_token,
-    jwt_required, get_jwt_identity, get_jwt
+    jwt_required, get_jwt_identity, get_jwt, decode_token
 )
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+import base64
+import json
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 import os
 
 from config import Config
 from models import db, User, Role, AttendanceSync, SyncApproval
 from face_recognition import FaceRecognitionService
+from face_backends import create_backend
+from recognition_stream import init_recognition_stream
+from attendance_dedupe import AttendanceDeduper
 from auth import role_required, admin_required, supervisor_or_admin_required
 from init_db import init_database
 from version import __version__, __app_name__
@@ -34,8 +40,29 @@ CORS(app)
 
 db.init_app(app)
 jwt = JWTManager(app)
-
-face_service = FaceRecognitionService()
+mongo_service.configure(app.config)
+
+face_service = FaceRecognitionService(
+    rebuild_threshold=app.config['FACE_REBUILD_THRESHOLD'],
+    cache_dir=app.config['FACE_CACHE_DIR'] or app.instance_path,
+    train_workers=app.config['FACE_TRAIN_WORKERS'],
+    batch_threads=app.config['FACE_BATCH_THREADS'],
+    annotate_quality=app.config['FACE_ANNOTATE_JPEG_QUALITY'],
+    annotate_max_width=app.config['FACE_ANNOTATE_MAX_WIDTH'],
+    detect_max_width=app.config['FACE_DETECT_MAX_WIDTH'],
+    min_face_size=app.config['FACE_MIN_FACE_SIZE'],
+    detect_max_size=app.config['FACE_DETECT_MAX_SIZE'],
+    backend=create_backend(app.config),
+    max_samples=app.config['FACE_MAX_SAMPLES_PER_WORKER'],
+    result_cache_size=app.config['FACE_RESULT_CACHE_SIZE'],
+    result_cache_ttl=app.config['FACE_RESULT_CACHE_TTL'],
+    track_options={
+        "iou_threshold": app.config['FACE_TRACK_IOU_THRESHOLD'],
+        "reidentify_every": app.config['FACE_TRACK_REIDENTIFY_EVERY'],
+        "max_missed": app.config['FACE_TRACK_MAX_MISSED'],
+        "max_hash_distance": app.config['FACE_TRACK_MAX_HASH_DISTANCE']
+    }
+)
 
 blocklisted_tokens = set()
 
@@ -86,6 +113,76 @@ def revoked_token_callback(jwt_header, jwt_payload):
     }), 401
 
 
+def get_request_image():
+    """Obtiene la imagen de la petición y sus parámetros
+    
+    Acepta bytes JPEG/PNG crudos (application/octet-stream o image/*, con
+    parámetros en la query string), multipart con el archivo en "image" o
+    JSON con la imagen en base64. Retorna (imagen, parámetros).
+    """
+    if request.mimetype == 'application/octet-stream' or request.mimetype.startswith('image/'):
+        return request.get_data(), request.args
+    
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('image')
+        return (upload.read() if upload else None), request.form
+    
+    data = request.get_json() or {}
+    return data.get('image'), data
+
+
+def as_bool(value):
+    """Interpreta banderas que llegan como bool en JSON o como texto en formularios"""
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+
+def recognition_options(data):
+    """Opciones de reconocimiento de la petición, acotadas por la configuración"""
+    max_faces = app.config['FACE_MAX_FACES']
+    return {
+        "multi": as_bool(data.get('multi', False)),
+        "max_faces": min(int(data.get('max_faces') or max_faces), max_faces),
+        "min_face_size": int(data.get('min_face_size') or app.config['FACE_MIN_FACE_SIZE']),
+        "annotate": as_bool(data.get('annotate', False))
+    }
+
+
+def authenticate_token(token):
+    """Valida un access token recibido fuera de los headers (WebSocket); retorna sus claims o None"""
+    if not token:
+        return None
+    try:
+        claims = decode_token(token)
+    except Exception as e:
+        print(f"[JWT ERROR] Token inválido: {str(e)}")
+        return None
+    
+    if claims.get('type') != 'access' or claims['jti'] in blocklisted_tokens:
+        return None
+    return claims
+
+
+# Reconocimientos repetidos del mismo trabajador en el mismo kiosco dentro
+# de la ventana se marcan como duplicados (0 = desactivado)
+attendance_deduper = AttendanceDeduper(
+    app.config['ATTENDANCE_DEDUPE_WINDOW']
+) if app.config['ATTENDANCE_DEDUPE_WINDOW'] > 0 else None
+
+
+def flag_duplicates(result, params):
+    """Aplica la ventana anti-rebote al resultado según el kiosco de la petición"""
+    if attendance_deduper is None:
+        return result
+    kiosk_id = params.get('kiosk_id') or get_jwt_identity()
+    return attendance_deduper.flag(result, kiosk_id, params.get('event_type'))
+
+
+init_recognition_stream(app, face_service, authenticate_token, recognition_options,
+                        attendance_deduper)
+
+
 @app.route('/api/health', methods=['GET'])
 def health():
     """Verifica estado del servidor"""
@@ -408,13 +505,13 @@ def get_roles():
 def detect_face():
     """Detecta si hay un rostro en la imagen"""
     try:
-        data = request.get_json()
-        base64_image = data.get('image')
+        image_data, _ = get_request_image()
         
-        if not base64_image:
+        if not image_data:
             return jsonify({"success": False, "message": "No se proporcionó imagen"}), 400
         
-        img = face_service.base64_to_image(base64_image)
+        # Para detectar basta la imagen en gris
+        img = face_service.decode_image(image_data, grayscale=True)
         coords, face_roi, gray = face_service.detect_face(img)
         
         if coords is None:
@@ -427,7 +524,7 @@ def detect_face():
         return jsonify({
             "success": True,
             "face_detected": True,
-            "coords": coords,
+            "coords": [int(v) for v in coords],
             "message": "Rostro detectado"
         })
         
@@ -440,14 +537,60 @@ def detect_face():
 def recognize():
     """Reconoce trabajador en imagen"""
     try:
-        data = request.get_json()
-        base64_image = data.get('image')
+        image_data, params = get_request_image()
         
-        if not base64_image:
+        if not image_data:
             return jsonify({"success": False, "message": "No se proporcionó imagen"}), 400
         
-        result = face_service.recognize_face(base64_image)
-        return jsonify(result)
+        result = face_service.recognize_face(image_data, **recognition_options(params))
+        return jsonify(flag_duplicates(result, params))
+        
+    except Exception as e:
+        return jsonify({"success": False, "message": str(e)}), 500
+
+
+@app.route('/api/recognize/batch', methods=['POST'])
+@jwt_required()
+def recognize_batch():
+    """Reconoce trabajadores en varias imágenes en una sola petición"""
+    try:
+        data = request.get_json()
+        images = data.get('images')
+        
+        if not images or not isinstance(images, list):
+            return jsonify({"success": False, "message": "No se proporcionaron imágenes"}), 400
+        
+        max_items = app.config['FACE_BATCH_MAX_ITEMS']
+        if len(images) > max_items:
+            return jsonify({
+                "success": False,
+                "message": f"Máximo {max_items} imágenes por petición"
+            }), 400
+        
+        # Cada elemento puede ser la imagen base64 o {"id": ..., "image": ...}
+        ids = [item.get('id') if isinstance(item, dict) else None for item in images]
+        base64_images = [item.get('image') if isinstance(item, dict) else item for item in images]
+        
+        if not all(base64_images):
+            return jsonify({"success": False, "message": "Hay elementos sin imagen"}), 400
+        
+        # Con "track" las imágenes son cuadros consecutivos de una misma cámara
+        results = face_service.recognize_batch(
+            base64_images,
+            track=as_bool(data.get('track', False)),
+            **recognition_options(data)
+        )
+        for index, (item_id, result) in enumerate(zip(ids, results)):
+            flag_duplicates(result, data)
+            result['index'] = index
+            if item_id is not None:
+                result['id'] = item_id
+        
+        return jsonify({
+            "success": True,
+            "results": results,
+            "count": len(results)
+        })
         
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
@@ -460,12 +603,11 @@ def register():
     """Registra nuevo trabajador (solo admin)"""
     try:
         from models import Worker
-        data = request.get_json()
-        base64_image = data.get('image')
-        worker_name = data.get('name')
+        image_data, params = get_request_image()
+        worker_name = params.get('name')
         current_user_id = get_jwt_identity()
         
-        if not base64_image or not worker_name:
+        if not image_data or not worker_name:
             return jsonify({
                 "success": False, 
                 "message": "Se requiere imagen y nombre"
@@ -480,7 +622,7 @@ def register():
             }), 400
         
         # Registrar en el sistema de reconocimiento facial
-        result = face_service.register_worker(base64_image, worker_name)
+        result = face_service.register_worker(image_data, worker_name)
         
         if result.get('success'):
             # Guardar en la base de datos
@@ -544,6 +686,27 @@ def get_worker_photo(worker_name):
         return jsonify({"success": False, "message": str(e)}), 500
 
 
+@app.route('/api/workers/<worker_name>/samples', methods=['POST'])
+@jwt_required()
+@admin_required()  # Solo admin puede enrolar trabajadores
+def add_worker_sample(worker_name):
+    """Agrega una imagen de enrolamiento a un trabajador registrado (solo admin)"""
+    try:
+        image_data, _ = get_request_image()
+        
+        if not image_data:
+            return jsonify({
+                "success": False,
+                "message": "No se proporcionó imagen"
+            }), 400
+        
+        result = face_service.add_worker_sample(image_data, worker_name)
+        return jsonify(result)
+        
+    except Exception as e:
+        return jsonify({"success": False, "message": str(e)}), 500
+
+
 @app.route('/api/workers/<worker_name>', methods=['DELETE'])
 @jwt_required()
 @admin_required()  # Solo admin puede eliminar trabajadores
@@ -571,18 +734,68 @@ def delete_worker(worker_name):
 @jwt_required()
 @supervisor_or_admin_required()
 def retrain():
-    """Re-entrena el modelo con el dataset actual (supervisor o admin)"""
+    """Encola el re-entrenamiento del modelo con el dataset actual (supervisor o admin)
+    
+    El modelo actual sigue reconociendo hasta que el nuevo esté listo; el
+    avance se consulta en /api/retrain/<job_id>.
+    """
     try:
-        face_service.load_and_train()
+        job = face_service.start_retrain()
         return jsonify({
             "success": True,
-            "message": "Modelo re-entrenado exitosamente",
+            "message": "Re-entrenamiento en curso",
+            "job": job,
             "workers_count": len(face_service.names)
+        }), 202
+    except Exception as e:
+        return jsonify({"success": False, "message": str(e)}), 500
+
+
+@app.route('/api/retrain/<job_id>', methods=['GET'])
+@jwt_required()
+@supervisor_or_admin_required()
+def retrain_status(job_id):
+    """Obtiene el estado y avance de un re-entrenamiento (supervisor o admin)"""
+    job = face_service.get_training_job(job_id)
+    if not job:
+        return jsonify({
+            "success": False,
+            "message": "Trabajo de entrenamiento no encontrado"
+        }), 404
+    
+    return jsonify({
+        "success": True,
+        "job": job
+    })
+
+
+@app.route('/api/model/stats', methods=['GET'])
+@jwt_required()
+@supervisor_or_admin_required()
+def model_stats():
+    """Obtiene el estado del modelo de reconocimiento y de su índice (supervisor o admin)"""
+    try:
+        return jsonify({
+            "success": True,
+            "model": face_service.get_model_stats()
         })
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
 
+# Máximo de valores por cláusula IN en las consultas de sincronización
+SYNC_QUERY_CHUNK = 500
+# Filas leídas por vez al transmitir la descarga en NDJSON
+SYNC_STREAM_CHUNK = 500
+
+
+def to_naive_utc(value):
+    """Normaliza a UTC sin zona horaria, como SQLite guarda y retorna las fechas"""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
 @app.route('/api/sync/upload', methods=['POST'])
 @jwt_required()
 def sync_upload():
@@ -597,24 +810,48 @@ def sync_upload():
                 "message": "No se proporcionaron registros"
             }), 400
         
+        rows = [{
+            "worker_id": record['workerId'],
+            "worker_name": record['workerName'],
+            "type": record['type'],
+            "timestamp": to_naive_utc(datetime.fromisoformat(record['timestamp'])),
+            "confidence": record.get('confidence'),
+            "client_id": record.get('clientId')
+        } for record in records]
+        
+        # Pares (trabajador, hora) ya guardados, consultados por conjunto en
+        # lugar de una consulta por registro
+        worker_ids = list({row["worker_id"] for row in rows})
+        timestamps = [row["timestamp"] for row in rows]
+        existing = set()
+        for start in range(0, len(worker_ids), SYNC_QUERY_CHUNK):
+            pairs = db.session.query(
+                AttendanceSync.worker_id, AttendanceSync.timestamp
+            ).filter(
+                AttendanceSync.worker_id.in_(worker_ids[start:start + SYNC_QUERY_CHUNK]),
+                AttendanceSync.timestamp.between(min(timestamps), max(timestamps))
+            )
+            existing.update(tuple(pair) for pair in pairs)
+        
+        new_rows = []
+        for row in rows:
+            key = (row["worker_id"], row["timestamp"])
+            if key not in existing:
+                existing.add(key)
+                new_rows.append(row)
+        
         synced_count = 0
-        for record in records:
-            existing = AttendanceSync.query.filter_by(
-                worker_id=record['workerId'],
-                timestamp=datetime.fromisoformat(record['timestamp'])
-            ).first()
-            
-            if not existing:
-                new_record = AttendanceSync(
-                    worker_id=record['workerId'],
-                    worker_name=record['workerName'],
-                    type=record['type'],
-                    timestamp=datetime.fromisoformat(record['timestamp']),
-                    confidence=record.get('confidence'),
-                    client_id=record.get('clientId')
-                )
-                db.session.add(new_record)
-                synced_count += 1
+        if new_rows:
+            # El índice único (worker_id, timestamp) descarta lo que otra
+            # subida simultánea haya insertado entre la consulta y el insert;
+            # rowcount solo cuenta las filas realmente insertadas
+            result = db.session.execute(
+                sqlite_insert(AttendanceSync).on_conflict_do_nothing(
+                    index_elements=['worker_id', 'timestamp']
+                ),
+                new_rows
+            )
+            synced_count = result.rowcount
         
         db.session.commit()
         
@@ -629,24 +866,79 @@ def sync_upload():
         return jsonify({"success": False, "message": str(e)}), 500
 
 
+def encode_sync_cursor(record):
+    """Cursor opaco con la posición (synced_at, id) del último registro entregado"""
+    position = json.dumps([record.synced_at.isoformat(), record.id])
+    return base64.urlsafe_b64encode(position.encode('utf-8')).decode('ascii')
+
+
+def decode_sync_cursor(cursor):
+    try:
+        synced_at, record_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(synced_at), int(record_id)
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+
 @app.route('/api/sync/download', methods=['GET'])
 @jwt_required()
 def sync_download():
-    """Descarga registros de asistencia desde el servidor"""
+    """Descarga registros de asistencia desde el servidor
+    
+    Pagina por (synced_at, id): cada respuesta trae "next_cursor" para pedir
+    la página siguiente con ?cursor=. Con ?format=ndjson se transmiten todos
+    los registros restantes, uno por línea, cada uno con su propio cursor
+    para poder retomar la descarga si se interrumpe.
+    """
     try:
         since = request.args.get('since')
+        cursor = request.args.get('cursor')
         
         query = AttendanceSync.query
         if since:
             since_date = datetime.fromisoformat(since)
             query = query.filter(AttendanceSync.synced_at >= since_date)
         
-        records = query.order_by(AttendanceSync.timestamp.desc()).limit(1000).all()
+        if cursor:
+            try:
+                synced_at, record_id = decode_sync_cursor(cursor)
+            except ValueError as e:
+                return jsonify({"success": False, "message": str(e)}), 400
+            query = query.filter(db.or_(
+                AttendanceSync.synced_at > synced_at,
+                db.and_(AttendanceSync.synced_at == synced_at, AttendanceSync.id > record_id)
+            ))
+        
+        query = query.order_by(AttendanceSync.synced_at, AttendanceSync.id)
+        
+        if request.args.get('format') == 'ndjson':
+            def generate():
+                for record in query.yield_per(SYNC_STREAM_CHUNK):
+                    data = record.to_dict()
+                    data['cursor'] = encode_sync_cursor(record)
+                    yield json.dumps(data, ensure_ascii=False) + '\n'
+            
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        
+        page_size = app.config['SYNC_DOWNLOAD_PAGE_SIZE']
+        try:
+            limit = int(request.args.get('limit') or page_size)
+        except ValueError:
+            return jsonify({"success": False, "message": "limit debe ser un número entero"}), 400
+        # Un límite negativo sería LIMIT -1 (sin límite) en SQLite
+        limit = max(1, min(limit, page_size))
+        
+        # Se pide uno más para saber si hay otra página sin contar el total
+        records = query.limit(limit + 1).all()
+        has_more = len(records) > limit
+        records = records[:limit]
         
         return jsonify({
             "success": True,
             "records": [record.to_dict() for record in records],
-            "count": len(records)
+            "count": len(records),
+            "has_more": has_more,
+            "next_cursor": encode_sync_cursor(records[-1]) if has_more else None
         }), 200
         
     except Exception as e:
@@ -663,9 +955,11 @@ def get_stats():
         total_users = User.query.count()
         total_records = AttendanceSync.query.count()
         
-        today = datetime.utcnow().date()
+        # Rango en lugar de date(timestamp) para aprovechar el índice
+        today = datetime.combine(datetime.utcnow().date(), datetime.min.time())
         today_records = AttendanceSync.query.filter(
-            db.func.date(AttendanceSync.timestamp) == today
+            AttendanceSync.timestamp >= today,
+            AttendanceSync.timestamp < today + timedelta(days=1)
         ).count()
         
         return jsonify({
@@ -0,0 +1,64 @@
+"""
+Ventana anti-rebote de asistencia en el momento del reconocimiento
+Un trabajador reconocido varias veces seguidas en el mismo kiosco genera un
+solo evento: las repeticiones dentro de la ventana se marcan como duplicadas
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+
+class AttendanceDeduper:
+    """Último reconocimiento por (kiosco, trabajador, tipo) con expiración
+    
+    Las entradas se guardan en orden de primera aparición, así las expiradas
+    se descartan desde el inicio sin recorrer toda la estructura.
+    """
+    
+    def __init__(self, window_seconds=60, max_entries=10000):
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self.duplicates = 0
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def check(self, kiosk_id, worker_name, event_type=None, now=None):
+        """Registra el reconocimiento; retorna (es duplicado, primera vez visto)"""
+        now = time.time() if now is None else now
+        key = (kiosk_id, worker_name, event_type)
+        
+        with self._lock:
+            self._expire(now)
+            first_seen = self._seen.get(key)
+            if first_seen is not None:
+                self.duplicates += 1
+                return True, first_seen
+            
+            self._seen[key] = now
+            if len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+            return False, now
+    
+    def _expire(self, now):
+        limit = now - self.window_seconds
+        while self._seen:
+            key, first_seen = next(iter(self._seen.items()))
+            if first_seen > limit:
+                break
+            del self._seen[key]
+    
+    def flag(self, result, kiosk_id, event_type=None):
+        """Marca "duplicate" en los rostros reconocidos de un resultado de recognize_face"""
+        if not result.get("success"):
+            return result
+        
+        faces = result.get("faces")
+        for face in (faces if faces is not None else [result]):
+            if not face.get("recognized"):
+                continue
+            duplicate, first_seen = self.check(kiosk_id, face["worker_name"], event_type)
+            face["duplicate"] = duplicate
+            if duplicate:
+                face["first_seen_at"] = datetime.utcfromtimestamp(first_seen).isoformat()
+        return result
@@ -16,3 +16,95 @@ class Config:
     
     CLOUD_SYNC_ENDPOINT = os.environ.get('CLOUD_SYNC_ENDPOINT') or None
     CLOUD_SYNC_API_KEY = os.environ.get('CLOUD_SYNC_API_KEY') or None
+    
+    # Registros/eliminaciones de trabajadores acumulados antes de reconstruir el modelo
+    FACE_REBUILD_THRESHOLD = int(os.environ.get('FACE_REBUILD_THRESHOLD', 10))
+    
+    # Directorio para cachés del modelo facial (por defecto, la carpeta instance/)
+    FACE_CACHE_DIR = os.environ.get('FACE_CACHE_DIR') or None
+    
+    # Procesos para la ingesta del dataset al entrenar (0 = un proceso por núcleo)
+    FACE_TRAIN_WORKERS = int(os.environ.get('FACE_TRAIN_WORKERS', 1))
+    
+    # Reconocimiento por lotes: máximo de imágenes por petición e hilos del pool
+    FACE_BATCH_MAX_ITEMS = int(os.environ.get('FACE_BATCH_MAX_ITEMS', 32))
+    FACE_BATCH_THREADS = int(os.environ.get('FACE_BATCH_THREADS', 4))
+    
+    # Reconocimiento de varios rostros por imagen (modo "multi")
+    FACE_MAX_FACES = int(os.environ.get('FACE_MAX_FACES', 4))
+    # Lado mínimo del rostro en píxeles, también para el reconocimiento de uno solo
+    FACE_MIN_FACE_SIZE = int(os.environ.get('FACE_MIN_FACE_SIZE', 40))
+    
+    # Imagen anotada opcional en el reconocimiento (flag "annotate")
+    FACE_ANNOTATE_JPEG_QUALITY = int(os.environ.get('FACE_ANNOTATE_JPEG_QUALITY', 80))
+    FACE_ANNOTATE_MAX_WIDTH = int(os.environ.get('FACE_ANNOTATE_MAX_WIDTH', 640))
+    
+    # Detección en tiempo real: ancho al que se reduce la imagen para detectar
+    # y tamaño máximo de rostro en píxeles (0 = sin límite)
+    FACE_DETECT_MAX_WIDTH = int(os.environ.get('FACE_DETECT_MAX_WIDTH', 640))
+    FACE_DETECT_MAX_SIZE = int(os.environ.get('FACE_DETECT_MAX_SIZE', 0))
+    
+    # Motor de reconocimiento: 'lbph' (OpenCV), 'lbp' (histogramas LBP
+    # vectorizados con NumPy) o 'dnn' (red local cargada con cv2.dnn).
+    # Cada motor tiene su propio umbral de distancia para aceptar un rostro
+    FACE_BACKEND = os.environ.get('FACE_BACKEND', 'lbph')
+    FACE_LBPH_THRESHOLD = float(os.environ.get('FACE_LBPH_THRESHOLD', 70))
+    FACE_LBP_THRESHOLD = float(os.environ.get('FACE_LBP_THRESHOLD', 0.6))
+    FACE_DNN_MODEL = os.environ.get('FACE_DNN_MODEL') or None
+    FACE_DNN_THRESHOLD = float(os.environ.get('FACE_DNN_THRESHOLD', 0.9))
+    FACE_DNN_INPUT_SIZE = int(os.environ.get('FACE_DNN_INPUT_SIZE', 96))
+    
+    # Índice aproximado IVF (motores 'lbp'/'dnn'): se usa desde
+    # FACE_ANN_MIN_SAMPLES muestras; NLIST = 0 elige raíz del total de muestras
+    FACE_ANN_ENABLED = os.environ.get('FACE_ANN_ENABLED', 'false').lower() == 'true'
+    FACE_ANN_MIN_SAMPLES = int(os.environ.get('FACE_ANN_MIN_SAMPLES', 1000))
+    FACE_ANN_NLIST = int(os.environ.get('FACE_ANN_NLIST', 0))
+    FACE_ANN_NPROBE = int(os.environ.get('FACE_ANN_NPROBE', 4))
+    
+    # Varias imágenes de enrolamiento por trabajador (foto + dataset/<trabajador>/)
+    # y, en los motores 'lbp'/'dnn', una plantilla promedio por trabajador
+    FACE_MAX_SAMPLES_PER_WORKER = int(os.environ.get('FACE_MAX_SAMPLES_PER_WORKER', 10))
+    FACE_AGGREGATE_TEMPLATES = os.environ.get('FACE_AGGREGATE_TEMPLATES', 'false').lower() == 'true'
+    
+    # Caché de resultados por hash perceptual del rostro: evita repetir la
+    # predicción con cuadros casi idénticos del kiosco (0 = desactivado)
+    FACE_RESULT_CACHE_SIZE = int(os.environ.get('FACE_RESULT_CACHE_SIZE', 256))
+    FACE_RESULT_CACHE_TTL = float(os.environ.get('FACE_RESULT_CACHE_TTL', 3.0))
+    
+    # Reconocimiento continuo por WebSocket (/api/recognize/stream, requiere
+    # flask-sock): segundos para autenticarse y sin cuadros antes de cerrar
+    FACE_STREAM_AUTH_TIMEOUT = int(os.environ.get('FACE_STREAM_AUTH_TIMEOUT', 10))
+    FACE_STREAM_IDLE_TIMEOUT = int(os.environ.get('FACE_STREAM_IDLE_TIMEOUT', 60))
+    FACE_STREAM_MAX_FRAME_BYTES = int(os.environ.get('FACE_STREAM_MAX_FRAME_BYTES', 2 * 1024 * 1024))
+    SOCK_SERVER_OPTIONS = {'ping_interval': 25, 'max_message_size': FACE_STREAM_MAX_FRAME_BYTES}
+    
+    # Seguimiento de rostros entre cuadros (WebSocket y lotes con "track"):
+    # se vuelve a predecir un rostro ya reconocido cada N cuadros
+    FACE_TRACK_IOU_THRESHOLD = float(os.environ.get('FACE_TRACK_IOU_THRESHOLD', 0.3))
+    FACE_TRACK_REIDENTIFY_EVERY = int(os.environ.get('FACE_TRACK_REIDENTIFY_EVERY', 10))
+    FACE_TRACK_MAX_MISSED = int(os.environ.get('FACE_TRACK_MAX_MISSED', 5))
+    # Bits distintos del hash perceptual del rostro antes de volver a predecir
+    FACE_TRACK_MAX_HASH_DISTANCE = int(os.environ.get('FACE_TRACK_MAX_HASH_DISTANCE', 12))
+    
+    # Ventana anti-rebote de asistencia: segundos en que un mismo trabajador
+    # reconocido en el mismo kiosco se marca como duplicado (0 = desactivado)
+    ATTENDANCE_DEDUPE_WINDOW = int(os.environ.get('ATTENDANCE_DEDUPE_WINDOW', 60))
+    
+    # Registros por página en /api/sync/download (máximo que puede pedir el cliente)
+    SYNC_DOWNLOAD_PAGE_SIZE = int(os.environ.get('SYNC_DOWNLOAD_PAGE_SIZE', 1000))
+    
+    # MongoDB (respaldo en Atlas): la URI se lee de MONGODB_URI. El pool es
+    # por proceso; con varios workers de Gunicorn conviene un MAX_POOL_SIZE
+    # bajo. READ_PREFERENCE aplica solo a las consultas de reportes
+    # (trabajadores y asistencias), las escrituras siempre van al primario
+    MONGO_DB_NAME = os.environ.get('MONGO_DB_NAME', 'facenomad')
+    MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 100))
+    MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 0))
+    MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', 0)) or None
+    MONGO_COMPRESSORS = os.environ.get('MONGO_COMPRESSORS', '')  # p. ej. 'zstd,snappy,zlib'
+    MONGO_WRITE_CONCERN = os.environ.get('MONGO_WRITE_CONCERN', '1')  # número o 'majority'
+    MONGO_WRITE_JOURNAL = {'true': True, 'false': False}.get(os.environ.get('MONGO_WRITE_JOURNAL', '').lower())
+    MONGO_READ_PREFERENCE = os.environ.get('MONGO_READ_PREFERENCE', 'primary')
+    MONGO_BULK_CHUNK_SIZE = int(os.environ.get('MONGO_BULK_CHUNK_SIZE', 1000))
+    MONGO_HEARTBEAT_MS = int(os.environ.get('MONGO_HEARTBEAT_MS', 10000))
+    MONGO_RECONNECT_MAX_DELAY = int(os.environ.get('MONGO_RECONNECT_MAX_DELAY', 300))
@@ -0,0 +1,289 @@
+"""
+Motores de reconocimiento facial intercambiables
+Cada motor entrena, a partir de los recortes de rostro en gris, un "matcher"
+inmutable que responde (etiqueta, distancia) para un rostro nuevo
+"""
+import os
+import cv2
+import numpy as np
+
+from face_index import IVFIndex
+from object_pool import ObjectPool
+
+
+class LBPHMatcher:
+    """Reconocedor LBPH de OpenCV ya entrenado"""
+    
+    def __init__(self, recognizer):
+        self.recognizer = recognizer
+    
+    def predict(self, face_roi, exclude=None):
+        """Retorna (etiqueta, distancia); con exclude, la mejor etiqueta fuera de ese conjunto
+        
+        Si todas están excluidas retorna la mejor de todas igualmente.
+        """
+        if not exclude:
+            label, distance = self.recognizer.predict(face_roi)
+            return label, float(distance)
+        
+        # LBPH no permite enmascarar: se piden las distancias de todas las muestras
+        collector = cv2.face.StandardCollector_create()
+        self.recognizer.predict_collect(face_roi, collector)
+        results = collector.getResults(True)
+        live = [result for result in results if result[0] not in exclude]
+        label, distance = (live or results)[0]
+        return int(label), float(distance)
+
+
+class LBPHBackend:
+    """Motor LBPH de OpenCV: compara el histograma del rostro contra cada muestra"""
+    name = "lbph"
+    model_extension = ".yml"
+    
+    def __init__(self, threshold=70):
+        self.threshold = threshold
+    
+    def signature(self):
+        """Parámetros que afectan al modelo entrenado (no incluye el umbral)"""
+        return {"name": self.name}
+    
+    def train(self, faces, labels):
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        recognizer.train(list(faces), np.array(labels))
+        return LBPHMatcher(recognizer)
+    
+    def save(self, matcher, path):
+        matcher.recognizer.write(path)
+    
+    def load(self, path):
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        recognizer.read(path)
+        return LBPHMatcher(recognizer)
+
+
+class EmbeddingMatcher:
+    """Un vector de características por muestra en una matriz contigua
+    
+    Como los vectores están normalizados, la distancia euclídea contra todo
+    el plantel sale de un solo producto matriz-vector.
+    """
+    
+    def __init__(self, backend, vectors, labels):
+        self.backend = backend
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.labels = np.asarray(labels, dtype=np.int64)
+    
+    def distances(self, vector):
+        """Distancia euclídea del vector normalizado a cada muestra"""
+        squared = 2.0 - 2.0 * (self.vectors @ vector)
+        return np.sqrt(np.maximum(squared, 0.0))
+    
+    def search(self, vector, exclude=None):
+        """Muestra más cercana, ignorando las etiquetas de exclude si queda alguna otra"""
+        distances = self.distances(vector)
+        if exclude:
+            masked = np.where(np.isin(self.labels, list(exclude)), np.inf, distances)
+            if np.isfinite(masked).any():
+                distances = masked
+        index = int(np.argmin(distances))
+        return int(self.labels[index]), float(distances[index])
+    
+    def predict(self, face_roi, exclude=None):
+        return self.search(self.backend.embed(face_roi), exclude)
+
+
+class EmbeddingBackend:
+    """Base de los motores que representan cada rostro con un vector fijo"""
+    model_extension = ".npz"
+    # Opciones del índice aproximado IVF; None = búsqueda exacta siempre
+    index_options = None
+    # Promediar las muestras de cada trabajador en una sola plantilla
+    aggregate_templates = False
+    
+    def embed(self, face_roi):
+        raise NotImplementedError
+    
+    def use_index(self, min_samples=1000, nlist=0, nprobe=4):
+        """Usa un índice IVF en lugar de la búsqueda exacta desde min_samples muestras"""
+        self.index_options = {"min_samples": min_samples, "nlist": nlist, "nprobe": nprobe}
+    
+    def use_templates(self, enabled=True):
+        """Entrena una plantilla por trabajador en lugar de un vector por muestra"""
+        self.aggregate_templates = enabled
+    
+    def signature(self):
+        return {"name": self.name, "index": self.index_options, "templates": self.aggregate_templates}
+    
+    def vectors(self, faces, labels):
+        """Vectores que se indexan: uno por muestra o una plantilla por etiqueta"""
+        vectors = np.vstack([self.embed(face_roi) for face_roi in faces])
+        if self.aggregate_templates:
+            return self._templates(vectors, labels)
+        return vectors, np.asarray(labels, dtype=np.int64)
+    
+    def train(self, faces, labels):
+        vectors, labels = self.vectors(faces, labels)
+        options = self.index_options
+        if options and len(vectors) >= options["min_samples"]:
+            return IVFIndex.build(self, vectors, labels, nlist=options["nlist"],
+                                  nprobe=options["nprobe"])
+        return EmbeddingMatcher(self, vectors, labels)
+    
+    def save(self, matcher, path):
+        # np.savez agrega ".npz" a los nombres sin esa extensión
+        with open(path, "wb") as f:
+            if isinstance(matcher, IVFIndex):
+                matcher.save(f)
+            else:
+                np.savez(f, kind=np.array("flat"), vectors=matcher.vectors, labels=matcher.labels)
+    
+    def load(self, path):
+        with np.load(path, allow_pickle=False) as data:
+            if "kind" in data.files and str(data["kind"]) == "ivf":
+                return IVFIndex.load(self, data)
+            return EmbeddingMatcher(self, data["vectors"], data["labels"])
+    
+    @staticmethod
+    def _templates(vectors, labels):
+        """Promedia los vectores de cada etiqueta y normaliza el resultado"""
+        unique, inverse = np.unique(np.asarray(labels, dtype=np.int64), return_inverse=True)
+        sums = np.zeros((len(unique), vectors.shape[1]), dtype=np.float32)
+        np.add.at(sums, inverse, vectors)
+        sums /= np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+        return sums, unique
+    
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+
+def _uniform_lbp_table():
+    """Asigna a cada código LBP de 8 bits su bin "uniforme" (58 + 1 para el resto)"""
+    table = np.full(256, 58, dtype=np.int64)
+    uniform = 0
+    for code in range(256):
+        bits = [(code >> i) & 1 for i in range(8)]
+        transitions = sum(bits[i] != bits[(i + 1) % 8] for i in range(8))
+        if transitions <= 2:
+            table[code] = uniform
+            uniform += 1
+    return table
+
+
+class LBPHistogramBackend(EmbeddingBackend):
+    """Histogramas LBP uniformes por celdas, calculados con NumPy
+    
+    Es la misma idea que LBPH, pero cada rostro queda en un vector fijo
+    (raíz de los histogramas normalizados) comparable con producto punto.
+    """
+    name = "lbp"
+    BINS = 59
+    _TABLE = _uniform_lbp_table()
+    
+    def __init__(self, threshold=0.6, size=96, grid=6):
+        self.threshold = threshold
+        self.size = size
+        self.grid = grid
+        
+        # Celda de la grilla a la que pertenece cada píxel interior
+        inner = size - 2
+        cell = np.minimum(np.arange(inner) * grid // inner, grid - 1)
+        self._cells = (cell[:, None] * grid + cell[None, :]) * self.BINS
+    
+    def signature(self):
+        return dict(super().signature(), size=self.size, grid=self.grid)
+    
+    def embed(self, face_roi):
+        img = cv2.resize(face_roi, (self.size, self.size), interpolation=cv2.INTER_AREA)
+        center = img[1:-1, 1:-1]
+        codes = np.zeros(center.shape, dtype=np.uint8)
+        offsets = [(-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1)]
+        for bit, (dy, dx) in enumerate(offsets):
+            neighbor = img[1 + dy:self.size - 1 + dy, 1 + dx:self.size - 1 + dx]
+            codes |= (neighbor >= center).astype(np.uint8) << bit
+        
+        bins = self._cells + self._TABLE[codes]
+        histogram = np.bincount(bins.ravel(), minlength=self.grid * self.grid * self.BINS)
+        histogram = histogram.reshape(self.grid * self.grid, self.BINS).astype(np.float32)
+        histogram /= np.maximum(histogram.sum(axis=1, keepdims=True), 1.0)
+        return self._normalize(np.sqrt(histogram))
+
+
+class DNNEmbeddingBackend(EmbeddingBackend):
+    """Vectores de una red neuronal local cargada con cv2.dnn (solo CPU)
+    
+    El modelo (p. ej. OpenFace .t7 o SFace .onnx) se lee desde disco; no se
+    descarga nada en tiempo de ejecución.
+    """
+    name = "dnn"
+    
+    def __init__(self, model_path, threshold=0.9, input_size=96, scale=1 / 255.0,
+                 mean=(0, 0, 0), swap_rb=True):
+        if not model_path or not os.path.exists(model_path):
+            raise ValueError(f"Modelo DNN no encontrado: {model_path}")
+        
+        self.model_path = model_path
+        self.threshold = threshold
+        self.input_size = input_size
+        self.scale = scale
+        self.mean = mean
+        self.swap_rb = swap_rb
+        # cv2.dnn.Net no es seguro entre hilos: cada embed toma una prestada
+        self._nets = ObjectPool(self._load_net)
+    
+    def signature(self):
+        return dict(
+            super().signature(),
+            model=os.path.basename(self.model_path),
+            model_size=os.path.getsize(self.model_path),
+            input_size=self.input_size
+        )
+    
+    def _load_net(self):
+        net = cv2.dnn.readNet(self.model_path)
+        net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        return net
+    
+    def embed(self, face_roi):
+        bgr = cv2.cvtColor(face_roi, cv2.COLOR_GRAY2BGR)
+        blob = cv2.dnn.blobFromImage(
+            bgr, self.scale, (self.input_size, self.input_size),
+            self.mean, swapRB=self.swap_rb, crop=False
+        )
+        with self._nets.borrow() as net:
+            net.setInput(blob)
+            return self._normalize(net.forward())
+
+
+def create_backend(config):
+    """Crea el motor de reconocimiento indicado en FACE_BACKEND"""
+    name = config.get('FACE_BACKEND', 'lbph')
+    
+    if name == 'lbph':
+        if config.get('FACE_ANN_ENABLED') or config.get('FACE_AGGREGATE_TEMPLATES'):
+            print("[WARN] El índice aproximado y las plantillas requieren un motor de vectores ('lbp' o 'dnn')")
+        return LBPHBackend(threshold=config.get('FACE_LBPH_THRESHOLD', 70))
+    
+    if name == 'lbp':
+        backend = LBPHistogramBackend(threshold=config.get('FACE_LBP_THRESHOLD', 0.6))
+    elif name == 'dnn':
+        backend = DNNEmbeddingBackend(
+            config.get('FACE_DNN_MODEL'),
+            threshold=config.get('FACE_DNN_THRESHOLD', 0.9),
+            input_size=config.get('FACE_DNN_INPUT_SIZE', 96)
+        )
+    else:
+        raise ValueError(f"Motor de reconocimiento desconocido: {name}")
+    
+    if config.get('FACE_AGGREGATE_TEMPLATES'):
+        backend.use_templates()
+    if config.get('FACE_ANN_ENABLED'):
+        backend.use_index(
+            min_samples=config.get('FACE_ANN_MIN_SAMPLES', 1000),
+            nlist=config.get('FACE_ANN_NLIST', 0),
+            nprobe=config.get('FACE_ANN_NPROBE', 4)
+        )
+    return backend
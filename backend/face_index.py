@@ -0,0 +1,194 @@
+"""
+Índice aproximado (IVF) de vectores de rostro para planteles grandes
+Agrupa los vectores con k-means y en cada búsqueda solo compara contra las
+listas de los nprobe centroides más cercanos, en lugar de todo el plantel
+"""
+import threading
+import time
+import numpy as np
+
+
+class IndexStats:
+    """Latencia de búsqueda y recall estimado, compartidos entre versiones del índice
+    
+    Una de cada recall_sample_rate búsquedas también se resuelve de forma
+    exacta para estimar cuántas veces el índice encuentra el mismo resultado.
+    """
+    
+    def __init__(self, recall_sample_rate=50):
+        self.recall_sample_rate = recall_sample_rate
+        self.searches = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.recall_checks = 0
+        self.recall_hits = 0
+        self._lock = threading.Lock()
+    
+    def should_check_recall(self):
+        return self.recall_sample_rate > 0 and self.searches % self.recall_sample_rate == 0
+    
+    def record(self, latency, recall_hit=None):
+        with self._lock:
+            self.searches += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            if recall_hit is not None:
+                self.recall_checks += 1
+                self.recall_hits += int(recall_hit)
+    
+    def to_dict(self):
+        with self._lock:
+            return {
+                "searches": self.searches,
+                "avg_latency_ms": (self.total_latency / self.searches * 1000) if self.searches else None,
+                "max_latency_ms": self.max_latency * 1000,
+                "recall_checks": self.recall_checks,
+                "recall": (self.recall_hits / self.recall_checks) if self.recall_checks else None
+            }
+
+
+class IVFIndex:
+    """Índice IVF inmutable sobre vectores normalizados
+    
+    add() y remove() retornan un índice nuevo que comparte los centroides y
+    todas las listas no afectadas, así registrar o eliminar trabajadores no
+    obliga a reconstruirlo.
+    """
+    # Distancia euclídea máxima entre vectores normalizados
+    MAX_DISTANCE = 2.0
+    
+    def __init__(self, backend, centroids, lists, nprobe, stats=None):
+        self.backend = backend
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        # Una lista por centroide: (vectores (n, D), etiquetas (n,))
+        self.lists = tuple(lists)
+        self.nprobe = max(1, min(nprobe, len(self.lists)))
+        # Listas con vectores: las vaciadas por remove() no se sondean
+        self._nonempty = np.array([index for index, (_, labels) in enumerate(self.lists)
+                                   if len(labels)], dtype=np.int64)
+        self.stats = stats or IndexStats()
+    
+    @classmethod
+    def build(cls, backend, vectors, labels, nlist=0, nprobe=4, iterations=10, seed=0):
+        """Entrena los centroides con k-means esférico y reparte los vectores"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        labels = np.asarray(labels, dtype=np.int64)
+        nlist = nlist or max(1, int(np.sqrt(len(vectors))))
+        nlist = min(nlist, len(vectors))
+        
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+        
+        for _ in range(iterations):
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            for index in range(nlist):
+                members = vectors[assignment == index]
+                if len(members) == 0:
+                    # Centroide vacío: se reubica en un vector al azar
+                    centroids[index] = vectors[rng.integers(len(vectors))]
+                    continue
+                centroid = members.sum(axis=0)
+                centroids[index] = centroid / max(np.linalg.norm(centroid), 1e-12)
+        
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        lists = [(vectors[assignment == index], labels[assignment == index])
+                 for index in range(nlist)]
+        return cls(backend, centroids, lists, nprobe)
+    
+    @property
+    def vectors(self):
+        return np.vstack([vectors for vectors, _ in self.lists])
+    
+    @property
+    def labels(self):
+        return np.concatenate([labels for _, labels in self.lists])
+    
+    def __len__(self):
+        return sum(len(labels) for _, labels in self.lists)
+    
+    def _search_lists(self, vector, list_indexes, exclude=None):
+        best_label, best_distance = -1, float("inf")
+        for index in list_indexes:
+            vectors, labels = self.lists[index]
+            if len(labels) == 0:
+                continue
+            squared = 2.0 - 2.0 * (vectors @ vector)
+            if exclude:
+                squared = np.where(np.isin(labels, list(exclude)), np.inf, squared)
+            position = int(np.argmin(squared))
+            distance = float(np.sqrt(max(squared[position], 0.0)))
+            if distance < best_distance:
+                best_label, best_distance = int(labels[position]), distance
+        return best_label, best_distance
+    
+    def search(self, vector, exclude=None):
+        """Retorna (etiqueta, distancia); sin candidatos, (-1, MAX_DISTANCE)
+        
+        La distancia siempre es finita para que el resultado se pueda enviar en JSON.
+        """
+        start = time.perf_counter()
+        candidates = self._nonempty
+        if len(candidates) == 0:
+            return -1, self.MAX_DISTANCE
+        
+        if self.nprobe < len(candidates):
+            scores = self.centroids[candidates] @ vector
+            probe = candidates[np.argpartition(-scores, self.nprobe - 1)[:self.nprobe]]
+        else:
+            probe = candidates
+        result = self._search_lists(vector, probe, exclude)
+        if result[0] == -1 and len(probe) < len(candidates):
+            # Todo lo sondeado estaba excluido: se busca en el resto de las listas
+            result = self._search_lists(vector, candidates, exclude)
+        latency = time.perf_counter() - start
+        
+        recall_hit = None
+        if self.stats.should_check_recall():
+            exact = self._search_lists(vector, candidates, exclude)
+            recall_hit = exact[0] == result[0]
+        self.stats.record(latency, recall_hit)
+        if result[0] == -1:
+            return -1, self.MAX_DISTANCE
+        return result
+    
+    def predict(self, face_roi, exclude=None):
+        return self.search(self.backend.embed(face_roi), exclude)
+    
+    def add(self, vectors, labels):
+        """Retorna un índice nuevo con los vectores agregados a su lista más cercana"""
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        labels = np.asarray(labels, dtype=np.int64)
+        assignment = np.argmax(vectors @ self.centroids.T, axis=1)
+        
+        lists = list(self.lists)
+        for index in np.unique(assignment):
+            list_vectors, list_labels = lists[index]
+            mask = assignment == index
+            lists[index] = (np.vstack([list_vectors, vectors[mask]]),
+                            np.concatenate([list_labels, labels[mask]]))
+        return IVFIndex(self.backend, self.centroids, lists, self.nprobe, self.stats)
+    
+    def remove(self, labels):
+        """Retorna un índice nuevo sin los vectores de las etiquetas indicadas"""
+        labels = np.asarray(list(labels), dtype=np.int64)
+        lists = []
+        for list_vectors, list_labels in self.lists:
+            mask = np.isin(list_labels, labels)
+            if mask.any():
+                list_vectors, list_labels = list_vectors[~mask], list_labels[~mask]
+            lists.append((list_vectors, list_labels))
+        return IVFIndex(self.backend, self.centroids, lists, self.nprobe, self.stats)
+    
+    def save(self, f):
+        """Guarda centroides y listas en un .npz (las listas quedan concatenadas)"""
+        sizes = np.array([len(labels) for _, labels in self.lists], dtype=np.int64)
+        np.savez(f, kind=np.array("ivf"), centroids=self.centroids, sizes=sizes,
+                 vectors=self.vectors, labels=self.labels, nprobe=np.array(self.nprobe))
+    
+    @classmethod
+    def load(cls, backend, data):
+        offsets = np.concatenate([[0], np.cumsum(data["sizes"])])
+        vectors, labels = data["vectors"], data["labels"]
+        lists = [(vectors[offsets[i]:offsets[i + 1]], labels[offsets[i]:offsets[i + 1]])
+                 for i in range(len(data["sizes"]))]
+        return cls(backend, data["centroids"], lists, int(data["nprobe"]))
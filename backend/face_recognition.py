@@ -1,24 +1,353 @@
 import cv2
 import os
+import shutil
+import hashlib
+import json
+import multiprocessing
+import threading
+import time
+import uuid
 import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
+from functools import partial
 import base64
 from io import BytesIO
 from PIL import Image
 
+from face_backends import LBPHBackend
+from face_tracking import FaceTracker
+from object_pool import ObjectPool
+
+# Clasificador propio de cada proceso del pool de ingesta del dataset
+_worker_cascade = None
+
+
+def _detection_pool_context():
+    """Contexto de procesos para el pool de ingesta
+    
+    El servidor ya tiene hilos (Flask, heartbeats de Mongo, entrenamiento):
+    hacer fork de un proceso con hilos puede heredar locks tomados, así que
+    los procesos salen de un forkserver que solo precarga este módulo (no
+    vuelve a ejecutar app.py). Donde no existe forkserver se usa spawn.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def _init_detection_worker(cascade_path):
+    """Inicializa un proceso del pool de ingesta con su propio clasificador"""
+    global _worker_cascade
+    # Cada proceso usa un solo hilo de OpenCV para no sobresuscribir los núcleos
+    cv2.setNumThreads(1)
+    _worker_cascade = cv2.CascadeClassifier(cascade_path)
+
+
+def _detect_dataset_face_worker(path, detect_params):
+    """Punto de entrada del pool: detecta el rostro de una imagen del dataset"""
+    return _extract_dataset_face(_worker_cascade, path, detect_params)
+
+
+def _extract_dataset_face(cascade, path, detect_params):
+    """Lee una imagen del dataset y retorna el recorte en gris del rostro"""
+    filename = os.path.basename(path)
+    img = cv2.imread(path)
+    
+    if img is None:
+        print(f"[WARN] No se pudo leer: {filename}")
+        return None
+    
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    faces = cascade.detectMultiScale(gray, **detect_params)
+    
+    if len(faces) == 0:
+        print(f"[WARN] No se detectó rostro en: {filename}")
+        return None
+    
+    (x, y, w, h) = faces[0]
+    return gray[y:y+h, x:x+w].copy()
+
+
+class FaceModel:
+    """Modelo de reconocimiento inmutable
+    
+    Nunca se modifica después de publicarse: registrar o eliminar trabajadores
+    crea un modelo nuevo que el servicio publica reemplazando la referencia,
+    así los hilos que reconocen nunca ven un modelo a medio actualizar. Los
+    rostros registrados desde el último entrenamiento completo viven en un
+    matcher "delta" pequeño que se entrena solo con ellos.
+    """
+    
+    def __init__(self, backend, matcher=None, names=None, removed_labels=(), delta_faces=()):
+        self.backend = backend
+        self.matcher = matcher
+        self.names = dict(names or {})
+        # Etiquetas de trabajadores eliminados que siguen dentro del matcher
+        # base hasta la próxima reconstrucción completa
+        self.removed_labels = frozenset(removed_labels)
+        self.delta_faces = tuple(delta_faces)
+        self.delta_matcher = None
+        
+        if self.delta_faces:
+            self.delta_matcher = backend.train(
+                [face_roi for face_roi, _ in self.delta_faces],
+                [label for _, label in self.delta_faces]
+            )
+    
+    @property
+    def trained(self):
+        return self.matcher is not None or self.delta_matcher is not None
+    
+    def predict(self, face_roi):
+        """Retorna (etiqueta, distancia) del rostro más parecido entre base y delta
+        
+        Las muestras de trabajadores eliminados siguen en el matcher base hasta
+        la reconstrucción: se excluyen para que no oculten al mismo trabajador
+        registrado de nuevo en el delta.
+        """
+        results = []
+        if self.matcher is not None:
+            results.append(self.matcher.predict(face_roi, self.removed_labels))
+        if self.delta_matcher is not None:
+            results.append(self.delta_matcher.predict(face_roi))
+        live = [result for result in results if result[0] not in self.removed_labels]
+        return min(live or results, key=lambda result: result[1])
+    
+    def with_face(self, face_roi, worker_name, append=False):
+        """Retorna un modelo nuevo con el rostro agregado
+        
+        Con append=True el rostro es una muestra más de un trabajador ya
+        registrado y usa su misma etiqueta; si no, reemplaza al trabajador.
+        Si el matcher base admite altas incrementales (índice IVF) el rostro
+        va directo a él; si no, al matcher delta.
+        """
+        labels = [label for label, name in self.names.items() if name == worker_name]
+        if append and labels:
+            model = self
+            label = labels[0]
+        else:
+            model = self.without_worker(worker_name)
+            label = max(list(model.names) + list(model.removed_labels), default=-1) + 1
+        names = dict(model.names)
+        names[label] = worker_name
+        
+        if hasattr(model.matcher, "add"):
+            matcher = model.matcher.add(self.backend.embed(face_roi), [label])
+            return FaceModel(self.backend, matcher, names, model.removed_labels, model.delta_faces)
+        
+        return FaceModel(self.backend, model.matcher, names, model.removed_labels,
+                         model.delta_faces + ((face_roi.copy(), label),))
+    
+    def with_worker_faces(self, face_rois, worker_name):
+        """Retorna un modelo nuevo en que el trabajador tiene exactamente estos rostros
+        
+        Reemplaza sus etiquetas por una nueva. Con plantillas por trabajador
+        los rostros se promedian en un solo vector, igual que al entrenar.
+        """
+        model = self.without_worker(worker_name)
+        label = max(list(model.names) + list(model.removed_labels), default=-1) + 1
+        names = dict(model.names)
+        names[label] = worker_name
+        labels = [label] * len(face_rois)
+        
+        if hasattr(model.matcher, "add"):
+            matcher = model.matcher.add(*self.backend.vectors(face_rois, labels))
+            return FaceModel(self.backend, matcher, names, model.removed_labels, model.delta_faces)
+        
+        # El matcher delta se entrena con el motor, que ya promedia por etiqueta
+        delta_faces = tuple((face_roi.copy(), label) for face_roi in face_rois)
+        return FaceModel(self.backend, model.matcher, names, model.removed_labels,
+                         model.delta_faces + delta_faces)
+    
+    def without_worker(self, worker_name):
+        """Retorna un modelo nuevo sin las etiquetas del trabajador"""
+        labels = {label for label, name in self.names.items() if name == worker_name}
+        if not labels:
+            return self
+        
+        names = {label: name for label, name in self.names.items() if label not in labels}
+        if not names:
+            return FaceModel(self.backend)
+        
+        delta_faces = [(face_roi, label) for face_roi, label in self.delta_faces
+                       if label not in labels]
+        
+        if hasattr(self.matcher, "remove"):
+            return FaceModel(self.backend, self.matcher.remove(labels), names,
+                             self.removed_labels, delta_faces)
+        
+        return FaceModel(self.backend, self.matcher, names,
+                         self.removed_labels | labels, delta_faces)
+
+
+class RecognitionCache:
+    """Caché LRU con expiración de resultados de reconocimiento por recorte
+    
+    La clave es un dHash del rostro: los cuadros casi idénticos que envía un
+    kiosco mientras la persona está frente a la cámara dan el mismo hash y
+    reutilizan la predicción anterior. Cada entrada recuerda el modelo con
+    que se calculó y solo vale mientras ese modelo siga publicado.
+    """
+    
+    def __init__(self, max_entries=256, ttl=3.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def dhash(face_roi, size=8):
+        """Hash perceptual de diferencias: 64 bits comparando píxeles vecinos"""
+        small = cv2.resize(face_roi, (size + 1, size), interpolation=cv2.INTER_AREA)
+        bits = (small[:, 1:] > small[:, :-1]).ravel()
+        return int.from_bytes(np.packbits(bits).tobytes(), "big")
+    
+    def get(self, key, model):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] is not model or entry[1] < now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+    
+    def put(self, key, model, result):
+        with self._lock:
+            self._entries[key] = (model, time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def to_dict(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
 class FaceRecognitionService:
-    def __init__(self, dataset_dir="dataset"):
+    # Parámetros optimizados para mejor detección en las fotos del dataset
+    TRAINING_DETECT_PARAMS = {
+        "scaleFactor": 1.1,
+        "minNeighbors": 3,
+        "minSize": (30, 30)
+    }
+    ROI_CACHE_VERSION = 1
+    IMAGE_EXTENSIONS = (".jpg", ".png", ".jpeg")
+    MAX_TRAINING_JOBS = 20
+    SNAPSHOT_VERSION = 2
+    
+    def __init__(self, dataset_dir="dataset", rebuild_threshold=10, cache_dir=None,
+                 train_workers=1, batch_threads=1, annotate_quality=80, annotate_max_width=640,
+                 detect_max_width=640, min_face_size=0, detect_max_size=0, backend=None,
+                 max_samples=10, result_cache_size=256, result_cache_ttl=3.0,
+                 track_options=None):
         self.dataset_dir = dataset_dir
+        # Máximo de imágenes de enrolamiento por trabajador (foto + muestras)
+        self.max_samples = max_samples
+        # Motor de reconocimiento (LBPH de OpenCV si no se indica otro)
+        self.backend = backend or LBPHBackend()
+        # Resolución de detección y límites de tamaño de rostro, en píxeles de
+        # la imagen original (0 = sin límite); min_face_size es el mínimo por
+        # omisión tanto de un solo rostro como del modo multi
+        self.detect_max_width = detect_max_width
+        self.min_face_size = min_face_size
+        self.detect_max_size = detect_max_size
+        # Calidad JPEG y ancho máximo de la imagen anotada opcional
+        self.annotate_quality = annotate_quality
+        self.annotate_max_width = annotate_max_width
+        # Pool de hilos compartido por las peticiones de reconocimiento por lotes
+        self._batch_pool = ThreadPoolExecutor(
+            max_workers=batch_threads,
+            thread_name_prefix="face-batch"
+        ) if batch_threads > 1 else None
+        # Procesos para detectar rostros del dataset en paralelo (0 = todos los núcleos)
+        self.train_workers = train_workers or os.cpu_count() or 1
+        self.cache_dir = cache_dir
+        # Caché en disco de los recortes de rostro, indexado por archivo, mtime y tamaño
+        self.roi_cache_path = os.path.join(cache_dir, "face_rois.npz") if cache_dir else None
+        # Metadatos del último modelo guardado (motor, etiquetas y huella del dataset)
+        self.snapshot_meta_path = os.path.join(cache_dir, "face_model.json") if cache_dir else None
         self.face_cascade_path = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-        self.face_cascade = cv2.CascadeClassifier(self.face_cascade_path)
-        self.recognizer = None
-        self.names = {}
-        self.trained = False
+        # CascadeClassifier no es seguro entre hilos: cada detección toma uno prestado
+        self._cascades = ObjectPool(partial(cv2.CascadeClassifier, self.face_cascade_path))
+        
+        # Parámetros de los FaceTracker de cada sesión (IoU, cada cuántos
+        # cuadros se vuelve a predecir y cuadros perdidos tolerados)
+        self.track_options = track_options or {}
+        # Resultados recientes por hash del rostro (0 entradas = sin caché)
+        self._result_cache = RecognitionCache(
+            result_cache_size, result_cache_ttl
+        ) if result_cache_size > 0 else None
+        
+        # Modelo publicado; los hilos que reconocen lo leen sin bloqueo y solo
+        # los que lo reemplazan (registro, eliminación, entrenamiento) toman
+        # self._lock entre ellos
+        self._model = FaceModel(self.backend)
+        # Registros o eliminaciones pendientes antes de reconstruir el modelo
+        self.rebuild_threshold = rebuild_threshold
+        self._lock = threading.RLock()
+        # Cambios aplicados mientras corre una reconstrucción (None = ninguna);
+        # se vuelven a aplicar sobre el modelo reconstruido antes de publicarlo
+        self._pending_changes = None
+        
+        # Trabajos de re-entrenamiento en segundo plano (los más recientes)
+        self._jobs = OrderedDict()
+        self._queued_job = None
+        self._job_thread = None
+        self._jobs_lock = threading.Lock()
         
         if not os.path.exists(self.dataset_dir):
             os.makedirs(self.dataset_dir)
         
-        self.load_and_train()
+        if not self._load_snapshot():
+            self.load_and_train()
+    
+    @property
+    def names(self):
+        return self._model.names
+    
+    def get_model_stats(self):
+        """Resumen del modelo publicado y, si lo usa, estadísticas del índice aproximado"""
+        model = self._model
+        stats = {
+            "backend": self.backend.name,
+            "threshold": self.backend.threshold,
+            "workers": len(model.names),
+            "delta_samples": len(model.delta_faces),
+            "removed_labels": len(model.removed_labels),
+            "result_cache": self._result_cache.to_dict() if self._result_cache else None,
+            "index": None
+        }
+        if hasattr(model.matcher, "stats"):
+            stats["index"] = dict(
+                model.matcher.stats.to_dict(),
+                type="ivf",
+                samples=len(model.matcher),
+                lists=len(model.matcher.lists),
+                nprobe=model.matcher.nprobe
+            )
+        return stats
+    
+    @property
+    def trained(self):
+        return self._model.trained
     
     def base64_to_image(self, base64_string):
         """Convierte imagen base64 a formato OpenCV"""
@@ -29,16 +358,69 @@ class FaceRecognitionService:
         img = Image.open(BytesIO(img_data))
         return cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
     
-    def image_to_base64(self, image):
+    def bytes_to_image(self, image_bytes, grayscale=False):
+        """Decodifica bytes JPEG/PNG directamente con OpenCV, sin pasar por PIL"""
+        flags = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+        img = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), flags)
+        if img is None:
+            raise ValueError("No se pudo decodificar la imagen")
+        return img
+    
+    def decode_image(self, image_data, grayscale=False):
+        """Decodifica una imagen recibida como bytes binarios o como texto base64"""
+        if isinstance(image_data, (bytes, bytearray)):
+            return self.bytes_to_image(image_data, grayscale)
+        
+        img = self.base64_to_image(image_data)
+        if grayscale:
+            return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        return img
+    
+    def image_to_base64(self, image, quality=95):
         """Convierte imagen OpenCV a base64"""
-        _, buffer = cv2.imencode('.jpg', image)
+        _, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
         img_base64 = base64.b64encode(buffer).decode('utf-8')
         return f"data:image/jpeg;base64,{img_base64}"
     
+    def _detect_boxes(self, gray, min_face_size=None):
+        """Ejecuta el detector sobre una copia reducida de la imagen
+        
+        La imagen se reduce a detect_max_width de ancho para detectar y las
+        cajas se escalan de vuelta a la resolución original, de modo que el
+        recorte del rostro para LBPH conserve todo el detalle.
+        """
+        height, width = gray.shape[:2]
+        scale = 1.0
+        small = gray
+        if self.detect_max_width and width > self.detect_max_width:
+            scale = self.detect_max_width / width
+            small = cv2.resize(gray, (self.detect_max_width, max(1, int(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+        
+        min_side = int((min_face_size or self.min_face_size) * scale)
+        max_side = int(self.detect_max_size * scale)
+        with self._cascades.borrow() as cascade:
+            faces = cascade.detectMultiScale(
+                small, 1.3, 5,
+                minSize=(min_side, min_side),
+                maxSize=(max_side, max_side)
+            )
+        
+        if scale == 1.0:
+            return [tuple(int(v) for v in face) for face in faces]
+        
+        boxes = []
+        for (x, y, w, h) in faces:
+            x, y = int(x / scale), int(y / scale)
+            w = min(int(round(w / scale)), width - x)
+            h = min(int(round(h / scale)), height - y)
+            boxes.append((x, y, w, h))
+        return boxes
+    
     def detect_face(self, image):
-        """Detecta rostro en imagen y retorna coordenadas"""
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
+        """Detecta rostro en imagen (color o gris) y retorna coordenadas"""
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        faces = self._detect_boxes(gray)
         
         if len(faces) == 0:
             return None, None, gray
@@ -48,66 +430,517 @@ class FaceRecognitionService:
         
         return (x, y, w, h), face_roi, gray
     
-    def load_and_train(self):
-        """Carga imágenes del dataset y entrena el modelo"""
+    def detect_faces(self, image, max_faces=None, min_face_size=None):
+        """Detecta todos los rostros de la imagen, del más grande al más pequeño
+        
+        Retorna ([((x, y, w, h), roi), ...], gray) limitado a max_faces rostros
+        y descartando los menores de min_face_size píxeles de lado.
+        """
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        faces = self._detect_boxes(gray, min_face_size)
+        
+        faces = sorted(faces, key=lambda f: f[2] * f[3], reverse=True)
+        if max_faces:
+            faces = faces[:max_faces]
+        
+        return [((x, y, w, h), gray[y:y+h, x:x+w]) for (x, y, w, h) in faces], gray
+    
+    def _detect_dataset_faces(self, paths, job=None):
+        """Detecta el rostro de cada imagen, en paralelo si train_workers > 1
+        
+        Retorna {ruta: roi o None} con los recortes en gris de cada rostro e
+        informa el avance en el trabajo de entrenamiento, si lo hay.
+        """
+        workers = min(self.train_workers, len(paths))
+        
+        if workers <= 1:
+            with self._cascades.borrow() as cascade:
+                rois = (_extract_dataset_face(cascade, path, self.TRAINING_DETECT_PARAMS)
+                        for path in paths)
+                return self._collect_detections(paths, rois, job)
+        
+        print(f"[INFO] Detectando rostros en {len(paths)} imágenes con {workers} procesos")
+        chunksize = max(1, len(paths) // (workers * 4))
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=_detection_pool_context(),
+            initializer=_init_detection_worker,
+            initargs=(self.face_cascade_path,)
+        ) as pool:
+            rois = pool.map(
+                _detect_dataset_face_worker,
+                paths,
+                [self.TRAINING_DETECT_PARAMS] * len(paths),
+                chunksize=chunksize
+            )
+            return self._collect_detections(paths, rois, job)
+    
+    def _collect_detections(self, paths, rois, job):
+        """Reúne los recortes detectados actualizando el avance del trabajo"""
+        detected = {}
+        for path, roi in zip(paths, rois):
+            detected[path] = roi
+            if job is not None:
+                job["images_processed"] += 1
+                if roi is not None:
+                    job["faces_found"] += 1
+        return detected
+    
+    def _roi_cache_signature(self):
+        """Identifica la versión del caché y los parámetros de detección usados"""
+        params = dict(self.TRAINING_DETECT_PARAMS, minSize=list(self.TRAINING_DETECT_PARAMS["minSize"]))
+        return {"version": self.ROI_CACHE_VERSION, "detect_params": params}
+    
+    def _load_roi_cache(self):
+        """Carga el caché de rostros preprocesados: {archivo: ((mtime, tamaño), roi)}"""
+        if not self.roi_cache_path or not os.path.exists(self.roi_cache_path):
+            return {}
+        
+        try:
+            with np.load(self.roi_cache_path, allow_pickle=False) as data:
+                meta = json.loads(str(data["meta"]))
+                if meta.get("signature") != self._roi_cache_signature():
+                    print("[INFO] Caché de rostros obsoleto, se regenerará")
+                    return {}
+                
+                cache = {}
+                for filename, entry in meta["entries"].items():
+                    roi = data[entry["roi"]] if entry["roi"] else None
+                    cache[filename] = ((entry["mtime"], entry["size"]), roi)
+                return cache
+        except Exception as e:
+            print(f"[WARN] No se pudo leer el caché de rostros: {str(e)}")
+            return {}
+    
+    def _save_roi_cache(self, cache):
+        """Guarda el caché de rostros en un único .npz comprimido"""
+        if not self.roi_cache_path:
+            return
+        
+        arrays = {}
+        entries = {}
+        for index, (filename, ((mtime, size), roi)) in enumerate(cache.items()):
+            key = None
+            if roi is not None:
+                key = f"roi_{index}"
+                arrays[key] = roi
+            entries[filename] = {"mtime": mtime, "size": size, "roi": key}
+        
+        meta = {"signature": self._roi_cache_signature(), "entries": entries}
+        arrays["meta"] = np.array(json.dumps(meta))
+        
+        try:
+            os.makedirs(os.path.dirname(self.roi_cache_path), exist_ok=True)
+            tmp_path = self.roi_cache_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(tmp_path, self.roi_cache_path)
+        except Exception as e:
+            print(f"[WARN] No se pudo guardar el caché de rostros: {str(e)}")
+    
+    def _list_dataset(self):
+        """Lista las imágenes del dataset ordenadas: [(archivo, ruta, (mtime, tamaño), trabajador)]
+        
+        Cada trabajador tiene su foto "<trabajador>.jpg" y puede tener muestras
+        adicionales en la carpeta "<trabajador>/"; todas comparten su etiqueta.
+        """
+        entries = []
+        for filename in sorted(os.listdir(self.dataset_dir)):
+            path = os.path.join(self.dataset_dir, filename)
+            if os.path.isdir(path):
+                for sample in sorted(os.listdir(path)):
+                    if sample.lower().endswith(self.IMAGE_EXTENSIONS):
+                        sample_path = os.path.join(path, sample)
+                        stat = os.stat(sample_path)
+                        entries.append((f"{filename}/{sample}", sample_path,
+                                        (stat.st_mtime_ns, stat.st_size), filename))
+            elif filename.lower().endswith(self.IMAGE_EXTENSIONS):
+                stat = os.stat(path)
+                entries.append((filename, path, (stat.st_mtime_ns, stat.st_size),
+                                os.path.splitext(filename)[0]))
+        return entries
+    
+    def _dataset_fingerprint(self, entries):
+        """Huella del dataset y de los parámetros con que se entrenaría el modelo"""
+        digest = hashlib.sha1()
+        signature = {"roi": self._roi_cache_signature(), "backend": self.backend.signature()}
+        digest.update(json.dumps(signature, sort_keys=True).encode("utf-8"))
+        for filename, _, (mtime, size), _ in entries:
+            digest.update(f"{filename}\0{mtime}\0{size}\n".encode("utf-8"))
+        return digest.hexdigest()
+    
+    def _save_snapshot(self, matcher, names, fingerprint):
+        """Guarda el modelo entrenado junto a su mapa de etiquetas y huella"""
+        if not self.snapshot_meta_path:
+            return
+        
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            previous = self._read_snapshot_meta()
+            
+            # El modelo se escribe con nombre propio y después se publica el
+            # JSON que lo referencia, así una escritura interrumpida nunca deja
+            # un JSON apuntando a un modelo incompleto
+            model_file = f"face_model_{self.backend.name}_{fingerprint[:16]}{self.backend.model_extension}"
+            self.backend.save(matcher, os.path.join(self.cache_dir, model_file))
+            
+            meta = {
+                "format_version": self.SNAPSHOT_VERSION,
+                "backend": self.backend.name,
+                "opencv_version": cv2.__version__,
+                "fingerprint": fingerprint,
+                "model_file": model_file,
+                "names": {str(label): name for label, name in names.items()},
+                "trained_at": datetime.utcnow().isoformat()
+            }
+            tmp_path = self.snapshot_meta_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(tmp_path, self.snapshot_meta_path)
+            
+            old_file = previous.get("model_file") if previous else None
+            if old_file and old_file != model_file:
+                old_path = os.path.join(self.cache_dir, old_file)
+                if os.path.exists(old_path):
+                    os.remove(old_path)
+        except Exception as e:
+            print(f"[WARN] No se pudo guardar el modelo entrenado: {str(e)}")
+    
+    def _read_snapshot_meta(self):
+        """Lee los metadatos del último modelo guardado, o None"""
+        if not self.snapshot_meta_path or not os.path.exists(self.snapshot_meta_path):
+            return None
+        try:
+            with open(self.snapshot_meta_path, encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"[WARN] No se pudieron leer los metadatos del modelo: {str(e)}")
+            return None
+    
+    def _load_snapshot(self):
+        """Carga el modelo guardado si corresponde exactamente al dataset actual"""
+        meta = self._read_snapshot_meta()
+        if not meta or meta.get("format_version") != self.SNAPSHOT_VERSION:
+            return False
+        
+        if meta.get("fingerprint") != self._dataset_fingerprint(self._list_dataset()):
+            print("[INFO] El dataset cambió desde el último entrenamiento")
+            return False
+        
+        if meta.get("backend") != self.backend.name:
+            return False
+        
+        try:
+            matcher = self.backend.load(os.path.join(self.cache_dir, meta["model_file"]))
+        except Exception as e:
+            print(f"[WARN] No se pudo cargar el modelo guardado: {str(e)}")
+            return False
+        
+        names = {int(label): name for label, name in meta["names"].items()}
+        with self._lock:
+            self._publish_model(FaceModel(self.backend, matcher, names))
+        print(f"[INFO] Modelo cargado desde {meta['model_file']} ({len(names)} trabajadores)")
+        return True
+    
+    def _build_model(self, previous_names=None, job=None):
+        """Lee el dataset completo y entrena un FaceModel nuevo
+        
+        Los trabajadores de previous_names conservan su etiqueta para que el
+        mapa etiqueta→nombre sea estable entre re-entrenamientos. Si se pasa
+        un trabajo de entrenamiento, se actualiza su avance.
+        """
         faces_list = []
         labels_list = []
-        self.names = {}
-        label_id = 0
+        names = {}
+        previous_labels = {name: label for label, name in (previous_names or {}).items()}
+        next_label = max(previous_labels.values(), default=-1) + 1
         
         print(f"[INFO] Cargando imágenes desde: {self.dataset_dir}")
         
         if not os.path.exists(self.dataset_dir):
             print("[WARN] Carpeta dataset no existe")
-            return
+            return FaceModel(self.backend)
         
-        for filename in os.listdir(self.dataset_dir):
-            if filename.lower().endswith((".jpg", ".png", ".jpeg")):
-                path = os.path.join(self.dataset_dir, filename)
-                img = cv2.imread(path)
-                
-                if img is None:
-                    print(f"[WARN] No se pudo leer: {filename}")
-                    continue
-                
-                gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-                
-                # Parámetros optimizados para mejor detección
-                faces = self.face_cascade.detectMultiScale(
-                    gray, 
-                    scaleFactor=1.1,
-                    minNeighbors=3,
-                    minSize=(30, 30)
-                )
-                
-                if len(faces) == 0:
+        cache = self._load_roi_cache()
+        new_cache = {}
+        
+        entries = self._list_dataset()
+        fingerprint = self._dataset_fingerprint(entries)
+        
+        pending = [path for filename, path, key, _ in entries
+                   if cache.get(filename, (None,))[0] != key]
+        
+        if job is not None:
+            cached_faces = sum(1 for filename, _, _, _ in entries
+                               if filename in cache and cache[filename][1] is not None)
+            job.update(stage="loading", images_total=len(entries),
+                       images_processed=len(entries) - len(pending), faces_found=cached_faces)
+        
+        detected_rois = self._detect_dataset_faces(pending, job) if pending else {}
+        detected = len(detected_rois)
+        
+        for filename, path, key, worker_name in entries:
+            if path in detected_rois:
+                face_roi = detected_rois[path]
+            else:
+                face_roi = cache[filename][1]
+                if face_roi is None:
                     print(f"[WARN] No se detectó rostro en: {filename}")
-                    continue
-                
-                (x, y, w, h) = faces[0]
-                face_roi = gray[y:y+h, x:x+w]
-                
-                faces_list.append(face_roi)
-                labels_list.append(label_id)
-                
-                worker_name = os.path.splitext(filename)[0]
-                self.names[label_id] = worker_name
-                label_id += 1
-        
-        if len(faces_list) > 0:
-            print(f"[INFO] {len(faces_list)} rostros cargados. Entrenando modelo...")
-            self.recognizer = cv2.face.LBPHFaceRecognizer_create()
-            self.recognizer.train(faces_list, np.array(labels_list))
-            self.trained = True
-            print("[INFO] Entrenamiento completado")
-        else:
+            
+            new_cache[filename] = (key, face_roi)
+            
+            if face_roi is None:
+                continue
+            
+            # Todas las muestras de un trabajador comparten su etiqueta
+            label_id = previous_labels.get(worker_name)
+            if label_id is None:
+                label_id = next_label
+                next_label += 1
+                previous_labels[worker_name] = label_id
+            
+            faces_list.append(face_roi)
+            labels_list.append(label_id)
+            names[label_id] = worker_name
+        
+        print(f"[INFO] {len(new_cache) - detected} imágenes desde caché, {detected} procesadas")
+        if detected > 0 or new_cache.keys() != cache.keys():
+            self._save_roi_cache(new_cache)
+        
+        if len(faces_list) == 0:
             print("[WARN] No hay rostros para entrenar")
-            self.trained = False
+            return FaceModel(self.backend)
+        
+        print(f"[INFO] {len(faces_list)} rostros cargados. Entrenando modelo...")
+        if job is not None:
+            job.update(stage="training", faces_found=len(faces_list))
+        matcher = self.backend.train(faces_list, labels_list)
+        print("[INFO] Entrenamiento completado")
+        self._save_snapshot(matcher, names, fingerprint)
+        return FaceModel(self.backend, matcher, names)
+    
+    def load_and_train(self):
+        """Carga imágenes del dataset y entrena el modelo"""
+        self._rebuild()
+    
+    def _publish_model(self, model):
+        """Reemplaza el modelo activo (llamar con self._lock tomado)"""
+        self._model = model
+        # Las predicciones del modelo anterior ya no valen
+        if self._result_cache is not None:
+            self._result_cache.clear()
+    
+    def _rebuild(self, job=None):
+        """Entrena un modelo nuevo con el dataset y lo publica
+        
+        El entrenamiento ocurre fuera del bloqueo, así el modelo anterior sigue
+        atendiendo reconocimientos hasta que se publica el nuevo. Los registros
+        y eliminaciones ocurridos mientras tanto se vuelven a aplicar sobre el
+        modelo nuevo en lugar de descartarlo y empezar otra vez.
+        """
+        with self._lock:
+            previous_names = dict(self._model.names)
+            self._pending_changes = []
+        
+        try:
+            model = self._build_model(previous_names, job)
+            
+            with self._lock:
+                if self._pending_changes:
+                    print(f"[INFO] Aplicando {len(self._pending_changes)} cambios "
+                          f"ocurridos durante la reconstrucción")
+                    for change in self._pending_changes:
+                        model = change(model)
+                    self._save_incremental_snapshot(model)
+                self._publish_model(model)
+                return model
+        finally:
+            with self._lock:
+                self._pending_changes = None
+    
+    def start_retrain(self):
+        """Encola un re-entrenamiento en segundo plano y retorna su trabajo
+        
+        Las solicitudes concurrentes se combinan: si ya hay un trabajo en cola
+        se retorna ese mismo, y si solo hay uno en curso se encola uno nuevo
+        que leerá el dataset con los cambios ocurridos mientras tanto.
+        """
+        with self._jobs_lock:
+            if self._queued_job is not None:
+                return dict(self._queued_job)
+            
+            job = {
+                "id": uuid.uuid4().hex,
+                "status": "queued",
+                "stage": None,
+                "images_total": 0,
+                "images_processed": 0,
+                "faces_found": 0,
+                "workers_count": None,
+                "error": None,
+                "created_at": datetime.utcnow().isoformat(),
+                "started_at": None,
+                "finished_at": None
+            }
+            self._jobs[job["id"]] = job
+            while len(self._jobs) > self.MAX_TRAINING_JOBS:
+                self._jobs.popitem(last=False)
+            self._queued_job = job
+            
+            if self._job_thread is None:
+                self._job_thread = threading.Thread(
+                    target=self._job_worker,
+                    name="face-training",
+                    daemon=True
+                )
+                self._job_thread.start()
+            
+            return dict(job)
+    
+    def get_training_job(self, job_id):
+        """Retorna una copia del estado del trabajo de entrenamiento, o None"""
+        with self._jobs_lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+    
+    def _job_worker(self):
+        """Ejecuta los trabajos de entrenamiento en cola, uno a la vez"""
+        while True:
+            with self._jobs_lock:
+                job = self._queued_job
+                if job is None:
+                    self._job_thread = None
+                    return
+                self._queued_job = None
+                job.update(status="running", started_at=datetime.utcnow().isoformat())
+            
+            try:
+                model = self._rebuild(job)
+                job.update(status="completed", stage=None, workers_count=len(model.names))
+            except Exception as e:
+                print(f"[ERROR] Error en re-entrenamiento: {str(e)}")
+                job.update(status="failed", error=str(e))
+            job["finished_at"] = datetime.utcnow().isoformat()
+    
+    def _apply_change(self, change):
+        """Publica change(modelo actual); si hay una reconstrucción en curso lo anota"""
+        with self._lock:
+            model = change(self._model)
+            self._publish_model(model)
+            if self._pending_changes is not None:
+                self._pending_changes.append(change)
+            self._save_incremental_snapshot(model)
+            self._maybe_schedule_rebuild(model)
+    
+    def _add_face(self, face_roi, worker_name, append=False):
+        """Agrega un rostro al modelo sin re-entrenar el dataset completo"""
+        self._apply_change(lambda model: model.with_face(face_roi, worker_name, append))
+    
+    def _set_worker_faces(self, face_rois, worker_name):
+        """Reemplaza los rostros del trabajador en el modelo sin re-entrenar el dataset"""
+        self._apply_change(lambda model: model.with_worker_faces(face_rois, worker_name))
+    
+    def _remove_worker(self, worker_name):
+        """Descarta al trabajador del modelo marcando sus etiquetas como eliminadas"""
+        self._apply_change(lambda model: model.without_worker(worker_name))
+    
+    def _save_incremental_snapshot(self, model):
+        """Guarda el modelo tras un alta o baja si el cambio quedó en el matcher base
+        
+        Ocurre con el índice IVF, que admite add/remove: así un reinicio carga
+        el índice actualizado en lugar de volver a calcular los vectores de
+        todo el plantel. Los cambios que viven en el delta esperan a la
+        reconstrucción. Llamar con self._lock tomado y el dataset ya escrito.
+        """
+        if model.matcher is None or model.delta_faces or model.removed_labels:
+            return
+        fingerprint = self._dataset_fingerprint(self._list_dataset())
+        self._save_snapshot(model.matcher, model.names, fingerprint)
+    
+    def _maybe_schedule_rebuild(self, model):
+        """Reconstruye en segundo plano si hay demasiados cambios acumulados"""
+        pending = len(model.removed_labels) + len(model.delta_faces)
+        if pending >= self.rebuild_threshold:
+            self.start_retrain()
+    
+    def _predict(self, model, face_roi):
+        """Predice el trabajador de un recorte: (nombre o None, confianza)"""
+        cache = self._result_cache
+        if cache is not None:
+            key = cache.dhash(face_roi)
+            cached = cache.get(key, model)
+            if cached is not None:
+                return cached
+        
+        label, confidence = model.predict(face_roi)
+        worker_name = model.names.get(label)
+        
+        if confidence < model.backend.threshold and worker_name is not None:
+            result = worker_name, confidence
+        else:
+            result = None, confidence
+        
+        if cache is not None:
+            cache.put(key, model, result)
+        return result
+    
+    def create_tracker(self):
+        """Crea el seguimiento de rostros para una sesión de cuadros consecutivos"""
+        return FaceTracker(**self.track_options)
     
-    def recognize_face(self, base64_image):
-        """Reconoce rostro en imagen base64"""
+    def _identify(self, model, coords, face_roi, tracker=None, track=None):
+        """Predice el rostro o reutiliza la identidad de su seguimiento
+        
+        Retorna (nombre o None, confianza, track o None).
+        """
+        if tracker is None:
+            return self._predict(model, face_roi) + (None,)
+        
+        if track is None:
+            track = tracker.match([coords])[0]
+        face_hash = RecognitionCache.dhash(face_roi)
+        if tracker.needs_predict(track, model, face_hash):
+            track.identify(model, *self._predict(model, face_roi), face_hash=face_hash)
+        return track.worker_name, track.confidence, track
+    
+    def _encode_annotated(self, img):
+        """Codifica la imagen anotada, reducida a annotate_max_width si es más ancha"""
+        height, width = img.shape[:2]
+        if self.annotate_max_width and width > self.annotate_max_width:
+            scale = self.annotate_max_width / width
+            img = cv2.resize(img, (self.annotate_max_width, int(height * scale)),
+                             interpolation=cv2.INTER_AREA)
+        return self.image_to_base64(img, self.annotate_quality)
+    
+    def _annotate(self, img, coords, worker_name, confidence):
+        """Dibuja el recuadro y el nombre del rostro sobre la imagen"""
+        x, y, w, h = coords
+        color = (0, 255, 0) if worker_name else (0, 0, 255)
+        label = worker_name or "Desconocido"
+        
+        cv2.rectangle(img, (x, y), (x + w, y + h), color, 2)
+        cv2.putText(img, f"{label} ({confidence:.1f})", 
+                   (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 
+                   0.9, color, 2)
+    
+    def recognize_face(self, image_data, multi=False, max_faces=None, min_face_size=None,
+                       annotate=False, tracker=None):
+        """Reconoce rostro en imagen base64 o bytes JPEG/PNG
+        
+        Con multi=True reconoce todos los rostros detectados (hasta max_faces)
+        y retorna la lista en "faces". La imagen anotada solo se genera con
+        annotate=True; si no, la imagen se decodifica directamente en gris.
+        Con un tracker (cuadros consecutivos de una sesión) se reutiliza la
+        identidad de los rostros ya reconocidos en cuadros anteriores.
+        """
         try:
-            img = self.base64_to_image(base64_image)
+            img = self.decode_image(image_data, grayscale=not annotate)
+            # Se toma el modelo publicado una sola vez para toda la petición
+            model = self._model
+            
+            if multi:
+                return self._recognize_faces(model, img, max_faces, min_face_size, annotate, tracker)
+            
             coords, face_roi, gray = self.detect_face(img)
             
             if coords is None:
@@ -117,7 +950,7 @@ class FaceRecognitionService:
                     "face_detected": False
                 }
             
-            if not self.trained:
+            if not model.trained:
                 x, y, w, h = coords
                 return {
                     "success": False,
@@ -126,38 +959,35 @@ class FaceRecognitionService:
                     "coords": [int(x), int(y), int(w), int(h)]
                 }
             
-            label, confidence = self.recognizer.predict(face_roi)
+            worker_name, confidence, track = self._identify(model, coords, face_roi, tracker)
             
             x, y, w, h = coords
             
-            if confidence < 70:
-                worker_name = self.names[label]
+            if worker_name is not None:
                 recognized = True
                 message = "Trabajador reconocido"
-                color = (0, 255, 0)
             else:
                 worker_name = "Desconocido"
                 recognized = False
                 message = "Trabajador no reconocido"
-                color = (0, 0, 255)
-            
-            cv2.rectangle(img, (x, y), (x + w, y + h), color, 2)
-            cv2.putText(img, f"{worker_name} ({confidence:.1f})", 
-                       (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 
-                       0.9, color, 2)
             
-            annotated_image = self.image_to_base64(img)
-            
-            return {
+            result = {
                 "success": True,
                 "recognized": recognized,
                 "worker_name": worker_name,
                 "confidence": float(confidence),
                 "message": message,
                 "face_detected": True,
-                "coords": [int(x), int(y), int(w), int(h)],
-                "annotated_image": annotated_image
+                "coords": [int(x), int(y), int(w), int(h)]
             }
+            if track is not None:
+                result["track_id"] = track.id
+            
+            if annotate:
+                self._annotate(img, coords, worker_name if recognized else None, confidence)
+                result["annotated_image"] = self._encode_annotated(img)
+            
+            return result
             
         except Exception as e:
             print(f"[ERROR] Error en reconocimiento: {str(e)}")
@@ -167,10 +997,87 @@ class FaceRecognitionService:
                 "face_detected": False
             }
     
-    def register_worker(self, base64_image, worker_name):
-        """Registra nuevo trabajador en el dataset"""
+    def _recognize_faces(self, model, img, max_faces, min_face_size, annotate=False, tracker=None):
+        """Reconoce cada rostro detectado en la imagen con una sola decodificación"""
+        detections, gray = self.detect_faces(img, max_faces, min_face_size)
+        
+        if not detections:
+            return {
+                "success": False,
+                "message": "No se detectó ningún rostro",
+                "face_detected": False,
+                "faces": []
+            }
+        
+        if not model.trained:
+            return {
+                "success": False,
+                "message": "El modelo no está entrenado. Registre trabajadores primero.",
+                "face_detected": True,
+                "faces": [{"coords": [int(v) for v in coords]} for coords, _ in detections]
+            }
+        
+        tracks = tracker.match([coords for coords, _ in detections]) if tracker else [None] * len(detections)
+        
+        faces = []
+        for (coords, face_roi), track in zip(detections, tracks):
+            worker_name, confidence, track = self._identify(model, coords, face_roi, tracker, track)
+            if annotate:
+                self._annotate(img, coords, worker_name, confidence)
+            face = {
+                "recognized": worker_name is not None,
+                "worker_name": worker_name or "Desconocido",
+                "confidence": float(confidence),
+                "coords": [int(v) for v in coords]
+            }
+            if track is not None:
+                face["track_id"] = track.id
+            faces.append(face)
+        
+        recognized_count = sum(1 for face in faces if face["recognized"])
+        
+        result = {
+            "success": True,
+            "recognized": recognized_count > 0,
+            "message": f"{recognized_count} de {len(faces)} rostros reconocidos",
+            "face_detected": True,
+            "faces": faces,
+            "count": len(faces),
+            "recognized_count": recognized_count
+        }
+        
+        if annotate:
+            result["annotated_image"] = self._encode_annotated(img)
+        
+        return result
+    
+    def recognize_batch(self, images, track=False, **options):
+        """Reconoce rostros en varias imágenes, en el mismo orden recibido
+        
+        Con batch_threads > 1 las imágenes se procesan en un pool de hilos:
+        OpenCV libera el GIL durante la decodificación, detección y predicción.
+        Con track=True las imágenes son cuadros consecutivos de una cámara y se
+        procesan en orden con un mismo seguimiento de rostros. Las demás
+        opciones se pasan tal cual a recognize_face.
+        """
+        if track:
+            tracker = self.create_tracker()
+            return [self.recognize_face(image, tracker=tracker, **options) for image in images]
+        
+        recognize = partial(self.recognize_face, **options)
+        
+        if self._batch_pool is None or len(images) <= 1:
+            return [recognize(image) for image in images]
+        
+        return list(self._batch_pool.map(recognize, images))
+    
+    def register_worker(self, image_data, worker_name):
+        """Registra nuevo trabajador en el dataset (imagen base64 o bytes)"""
         try:
-            img = self.base64_to_image(base64_image)
+            # Un JPEG binario se guarda tal cual: basta decodificarlo en gris
+            # para validar el rostro y se evita volver a codificarlo
+            raw_jpeg = isinstance(image_data, (bytes, bytearray)) and image_data[:3] == b"\xff\xd8\xff"
+            img = self.decode_image(image_data, grayscale=raw_jpeg)
             coords, face_roi, gray = self.detect_face(img)
             
             if coords is None:
@@ -183,9 +1090,13 @@ class FaceRecognitionService:
             filename = f"{clean_name}.jpg"
             filepath = os.path.join(self.dataset_dir, filename)
             
-            cv2.imwrite(filepath, img)
+            if raw_jpeg:
+                with open(filepath, "wb") as f:
+                    f.write(image_data)
+            else:
+                cv2.imwrite(filepath, img)
             
-            self.load_and_train()
+            self._add_face(face_roi, clean_name)
             
             return {
                 "success": True,
@@ -200,6 +1111,106 @@ class FaceRecognitionService:
                 "message": f"Error al registrar: {str(e)}"
             }
     
+    def _worker_paths(self, clean_name):
+        """Ruta de la foto del trabajador y de su carpeta de muestras adicionales"""
+        if not clean_name or ".." in clean_name or "/" in clean_name or "\\" in clean_name:
+            raise ValueError("Nombre de trabajador inválido")
+        
+        photo_path = os.path.join(self.dataset_dir, f"{clean_name}.jpg")
+        samples_dir = os.path.join(self.dataset_dir, clean_name)
+        
+        abs_dataset_dir = os.path.abspath(self.dataset_dir)
+        if os.path.dirname(os.path.abspath(samples_dir)) != abs_dataset_dir:
+            raise ValueError("Ruta de archivo inválida")
+        return photo_path, samples_dir
+    
+    def _sample_files(self, samples_dir):
+        if not os.path.isdir(samples_dir):
+            return []
+        return sorted(name for name in os.listdir(samples_dir)
+                      if name.lower().endswith(self.IMAGE_EXTENSIONS))
+    
+    def add_worker_sample(self, image_data, worker_name):
+        """Agrega una imagen de enrolamiento más a un trabajador ya registrado
+        
+        La muestra se guarda en dataset/<trabajador>/ y usa la misma etiqueta
+        que la foto principal, así varias tomas mejoran el reconocimiento.
+        """
+        try:
+            clean_name = worker_name.replace(" ", "_")
+            photo_path, samples_dir = self._worker_paths(clean_name)
+            samples = self._sample_files(samples_dir)
+            
+            if not os.path.exists(photo_path) and not samples:
+                return {
+                    "success": False,
+                    "message": f"No se encontró el trabajador '{worker_name}'"
+                }
+            
+            total = len(samples) + int(os.path.exists(photo_path))
+            if total >= self.max_samples:
+                return {
+                    "success": False,
+                    "message": f"El trabajador '{worker_name}' ya tiene {total} imágenes (máximo {self.max_samples})"
+                }
+            
+            raw_jpeg = isinstance(image_data, (bytes, bytearray)) and image_data[:3] == b"\xff\xd8\xff"
+            img = self.decode_image(image_data, grayscale=raw_jpeg)
+            coords, face_roi, gray = self.detect_face(img)
+            
+            if coords is None:
+                return {
+                    "success": False,
+                    "message": "No se detectó ningún rostro en la muestra"
+                }
+            
+            # Siguiente número libre, aunque se hayan borrado muestras intermedias
+            stems = (os.path.splitext(name)[0].rsplit("_", 1)[-1] for name in samples)
+            number = max((int(stem) for stem in stems if stem.isdigit()), default=0) + 1
+            filename = f"{clean_name}_{number:03d}.jpg"
+            os.makedirs(samples_dir, exist_ok=True)
+            filepath = os.path.join(samples_dir, filename)
+            
+            if raw_jpeg:
+                with open(filepath, "wb") as f:
+                    f.write(image_data)
+            else:
+                cv2.imwrite(filepath, img)
+            
+            if getattr(self.backend, "aggregate_templates", False):
+                # Con plantillas se recalcula la del trabajador con todas sus
+                # imágenes en lugar de sumar un vector suelto por muestra
+                paths = [os.path.join(samples_dir, name) for name in samples]
+                if os.path.exists(photo_path):
+                    paths.insert(0, photo_path)
+                with self._cascades.borrow() as cascade:
+                    rois = [_extract_dataset_face(cascade, path, self.TRAINING_DETECT_PARAMS)
+                            for path in paths]
+                self._set_worker_faces([roi for roi in rois if roi is not None] + [face_roi], clean_name)
+            else:
+                self._add_face(face_roi, clean_name, append=True)
+            
+            # La muestra recién agregada debe reconocerse como el mismo trabajador
+            recognized_as, confidence = self._predict(self._model, face_roi)
+            if recognized_as != clean_name:
+                print(f"[WARN] La muestra de '{clean_name}' se reconoce como "
+                      f"'{recognized_as or 'Desconocido'}' ({confidence:.2f})")
+            
+            return {
+                "success": True,
+                "message": f"Muestra agregada a '{worker_name}'",
+                "filename": f"{clean_name}/{filename}",
+                "samples": total + 1,
+                "recognized": recognized_as == clean_name
+            }
+            
+        except Exception as e:
+            print(f"[ERROR] Error al agregar muestra: {str(e)}")
+            return {
+                "success": False,
+                "message": f"Error al agregar muestra: {str(e)}"
+            }
+    
     def get_registered_workers(self):
         """Retorna lista de trabajadores registrados"""
         workers = []
@@ -211,39 +1222,30 @@ class FaceRecognitionService:
         return workers
     
     def delete_worker(self, worker_name):
-        """Elimina trabajador del dataset y re-entrena el modelo"""
+        """Elimina trabajador del dataset (foto y muestras) y lo descarta del modelo"""
         try:
             clean_name = worker_name.replace(" ", "_")
-            filename = f"{clean_name}.jpg"
             
-            filename = os.path.basename(filename)
-            
-            if ".." in filename or "/" in filename or "\\" in filename:
+            try:
+                filepath, samples_dir = self._worker_paths(clean_name)
+            except ValueError as e:
                 return {
                     "success": False,
-                    "message": "Nombre de trabajador inválido"
+                    "message": str(e)
                 }
             
-            filepath = os.path.join(self.dataset_dir, filename)
-            
-            abs_filepath = os.path.abspath(filepath)
-            abs_dataset_dir = os.path.abspath(self.dataset_dir)
-            
-            if not abs_filepath.startswith(abs_dataset_dir):
-                return {
-                    "success": False,
-                    "message": "Ruta de archivo inválida"
-                }
-            
-            if not os.path.exists(filepath):
+            if not os.path.exists(filepath) and not os.path.isdir(samples_dir):
                 return {
                     "success": False,
                     "message": f"No se encontró el archivo del trabajador '{worker_name}'"
                 }
             
-            os.remove(filepath)
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            if os.path.isdir(samples_dir):
+                shutil.rmtree(samples_dir)
             
-            self.load_and_train()
+            self._remove_worker(clean_name)
             
             return {
                 "success": True,
@@ -0,0 +1,119 @@
+"""
+Seguimiento liviano de rostros entre cuadros consecutivos
+Asocia cada detección con el rostro del cuadro anterior que más se le
+superpone (IoU), así la identidad ya reconocida se reutiliza y solo se
+vuelve a predecir en rostros nuevos o cada cierto número de cuadros
+"""
+from itertools import count
+
+
+def box_iou(a, b):
+    """Intersección sobre unión de dos recuadros (x, y, w, h)"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    inter_w = min(ax + aw, bx + bw) - max(ax, bx)
+    inter_h = min(ay + ah, by + bh) - max(ay, by)
+    if inter_w <= 0 or inter_h <= 0:
+        return 0.0
+    inter = inter_w * inter_h
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+class Track:
+    """Un rostro seguido a lo largo de los cuadros y su última identidad"""
+    
+    def __init__(self, track_id, box):
+        self.id = track_id
+        self.box = box
+        self.missed = 0
+        self.worker_name = None
+        self.confidence = None
+        # Modelo con que se predijo la identidad, hash del rostro en ese
+        # momento y cuadros desde entonces
+        self.model = None
+        self.face_hash = None
+        self.frames_since_predict = 0
+        # Se volvió a encontrar tras cuadros sin detección: puede ser otra persona
+        self.reacquired = False
+    
+    def identify(self, model, worker_name, confidence, face_hash=None):
+        self.model = model
+        self.worker_name = worker_name
+        self.confidence = confidence
+        self.face_hash = face_hash
+        self.frames_since_predict = 0
+        self.reacquired = False
+
+
+class FaceTracker:
+    """Seguimiento por IoU de una sesión (un kiosco o un lote de cuadros)
+    
+    No es seguro entre hilos: cada sesión procesa sus cuadros en orden.
+    """
+    
+    def __init__(self, iou_threshold=0.3, reidentify_every=10, max_missed=5, max_hash_distance=12):
+        self.iou_threshold = iou_threshold
+        self.reidentify_every = reidentify_every
+        self.max_missed = max_missed
+        # Bits distintos del dHash tolerados para seguir considerando el mismo rostro
+        self.max_hash_distance = max_hash_distance
+        self.tracks = []
+        self.predictions = 0
+        self.reused = 0
+        self._ids = count(1)
+    
+    def match(self, boxes):
+        """Retorna el Track de cada recuadro, creando los que no coinciden"""
+        pairs = sorted(
+            ((box_iou(track.box, box), track_index, box_index)
+             for track_index, track in enumerate(self.tracks)
+             for box_index, box in enumerate(boxes)),
+            reverse=True
+        )
+        
+        matched = [None] * len(boxes)
+        used_tracks = set()
+        for iou, track_index, box_index in pairs:
+            if iou < self.iou_threshold:
+                break
+            if track_index in used_tracks or matched[box_index] is not None:
+                continue
+            used_tracks.add(track_index)
+            matched[box_index] = self.tracks[track_index]
+        
+        tracks = []
+        for track_index, track in enumerate(self.tracks):
+            if track_index not in used_tracks:
+                track.missed += 1
+                if track.missed <= self.max_missed:
+                    tracks.append(track)
+        
+        for box_index, box in enumerate(boxes):
+            track = matched[box_index]
+            if track is None:
+                track = matched[box_index] = Track(next(self._ids), box)
+            else:
+                track.box = box
+                track.reacquired = track.reacquired or track.missed > 0
+                track.missed = 0
+                track.frames_since_predict += 1
+            tracks.append(track)
+        
+        self.tracks = tracks
+        return matched
+    
+    def needs_predict(self, track, model, face_hash=None):
+        """Decide si hay que volver a predecir el rostro del track
+        
+        Se predice en rostros nuevos o no reconocidos, con otro modelo, cada N
+        cuadros, al reaparecer tras cuadros sin detección (otra persona pudo
+        ocupar el mismo lugar) y cuando el dHash del rostro cambió demasiado.
+        """
+        changed = (face_hash is not None and track.face_hash is not None
+                   and bin(face_hash ^ track.face_hash).count("1") > self.max_hash_distance)
+        if (track.model is not model or track.worker_name is None or track.reacquired
+                or changed or track.frames_since_predict >= self.reidentify_every):
+            self.predictions += 1
+            return True
+        self.reused += 1
+        return False
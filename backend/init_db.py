@@ -1,10 +1,33 @@
 from models import db, User, Role, AttendanceSync, SyncApproval
 from datetime import datetime
+from sqlalchemy import inspect, text
+
+def migrate_indexes():
+    """Crea en bases existentes los índices que create_all solo agrega a tablas nuevas
+    
+    Antes del índice único de asistencias se eliminan los registros repetidos
+    por (trabajador, hora), conservando el más antiguo.
+    """
+    existing = {index['name'] for index in inspect(db.engine).get_indexes(AttendanceSync.__tablename__)}
+    
+    if 'uq_attendance_sync_worker_timestamp' not in existing:
+        result = db.session.execute(text(
+            "DELETE FROM attendance_sync WHERE id NOT IN ("
+            "SELECT MIN(id) FROM attendance_sync GROUP BY worker_id, timestamp)"
+        ))
+        db.session.commit()
+        if result.rowcount:
+            print(f"[INFO] {result.rowcount} asistencias duplicadas eliminadas")
+    
+    for table in (AttendanceSync.__table__, SyncApproval.__table__):
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
 
 def init_database(app):
     """Inicializa la base de datos y crea roles y usuario admin por defecto"""
     with app.app_context():
         db.create_all()
+        migrate_indexes()
         
         if Role.query.count() == 0:
             print("[INFO] Creando roles por defecto...")
@@ -94,6 +94,13 @@ class Worker(db.Model):
 
 class AttendanceSync(db.Model):
     __tablename__ = 'attendance_sync'
+    __table_args__ = (
+        # Un registro por trabajador y hora: las subidas repetidas son idempotentes
+        db.Index('uq_attendance_sync_worker_timestamp', 'worker_id', 'timestamp', unique=True),
+        db.Index('ix_attendance_sync_synced_at_id', 'synced_at', 'id'),
+        db.Index('ix_attendance_sync_timestamp', 'timestamp'),
+        db.Index('ix_attendance_sync_client_id', 'client_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     worker_id = db.Column(db.String(100), nullable=False)
@@ -122,6 +129,11 @@ class AttendanceSync(db.Model):
 
 class SyncApproval(db.Model):
     __tablename__ = 'sync_approvals'
+    __table_args__ = (
+        db.Index('ix_sync_approvals_requested_by_status', 'requested_by', 'status'),
+        db.Index('ix_sync_approvals_requested_by_requested_at', 'requested_by', 'requested_at'),
+        db.Index('ix_sync_approvals_status', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     requested_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -3,65 +3,246 @@ Servicio MongoDB para sincronización segura de datos
 Maneja la conexión y operaciones con MongoDB Atlas
 """
 import os
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
+import threading
+import time
+from pymongo import InsertOne, MongoClient, UpdateOne, WriteConcern, monitoring
+from pymongo.errors import BulkWriteError, ConnectionFailure, ServerSelectionTimeoutError
+from pymongo.read_preferences import (
+    Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+)
 from datetime import datetime
 
+
+class TopologyMonitor(monitoring.TopologyListener):
+    """Estado de la topología según los heartbeats que pymongo envía en segundo plano
+    
+    Guarda si hay un servidor que acepte escrituras y si hay uno legible con
+    la preferencia de lectura configurada, así saber si hay conexión no cuesta
+    un ping a Atlas en cada operación. Un secundario que responde no basta
+    para escribir mientras se elige un nuevo primario.
+    """
+    
+    def __init__(self, read_preference=None):
+        self.read_preference = read_preference
+        self.writable = False
+        self.readable = False
+        self.last_change = None
+    
+    def opened(self, event):
+        pass
+    
+    def description_changed(self, event):
+        description = event.new_description
+        writable = description.has_writable_server()
+        readable = description.has_readable_server(self.read_preference)
+        if (writable, readable) != (self.writable, self.readable):
+            self.last_change = datetime.utcnow().isoformat()
+            print(f"[MONGO INFO] Topología {description.topology_type_name}: "
+                  f"escritura {'disponible' if writable else 'sin servidor'}, "
+                  f"lectura {'disponible' if readable else 'sin servidor'}")
+        self.writable = writable
+        self.readable = readable
+    
+    def closed(self, event):
+        self.writable = False
+        self.readable = False
+
+
+READ_PREFERENCES = {
+    'primary': Primary,
+    'primaryPreferred': PrimaryPreferred,
+    'secondary': Secondary,
+    'secondaryPreferred': SecondaryPreferred,
+    'nearest': Nearest
+}
+
+# Módulo que necesita cada compresor de red además de pymongo
+COMPRESSOR_MODULES = {'zstd': 'zstandard', 'snappy': 'snappy', 'zlib': 'zlib'}
+
+
 class MongoService:
     def __init__(self):
         self.client = None
         self.db = None
+        # Base para consultas de reportes (puede leer de secundarios)
+        self.read_db = None
         self.connected = False
+        self.monitor = None
+        self._indexes_ready = False
+        self._indexes_retry_at = 0
+        self._reconnect_thread = None
+        self.configure({})
+    
+    def configure(self, config):
+        """Toma de Config los parámetros de conexión (antes de connect())"""
+        self.db_name = config.get('MONGO_DB_NAME', 'facenomad')
+        # Operaciones por cada bulk_write (un viaje de red por bloque)
+        self.bulk_chunk_size = config.get('MONGO_BULK_CHUNK_SIZE', 1000)
+        # Frecuencia de los heartbeats y espera máxima entre reintentos de conexión
+        self.heartbeat_ms = config.get('MONGO_HEARTBEAT_MS', 10000)
+        self.reconnect_max_delay = config.get('MONGO_RECONNECT_MAX_DELAY', 300)
+        # Pool de conexiones por proceso
+        self.max_pool_size = config.get('MONGO_MAX_POOL_SIZE', 100)
+        self.min_pool_size = config.get('MONGO_MIN_POOL_SIZE', 0)
+        self.max_idle_time_ms = config.get('MONGO_MAX_IDLE_TIME_MS')
+        self.compressors = config.get('MONGO_COMPRESSORS', '')
+        self.write_concern = config.get('MONGO_WRITE_CONCERN', '1')
+        self.write_journal = config.get('MONGO_WRITE_JOURNAL')
+        self.read_preference = config.get('MONGO_READ_PREFERENCE', 'primary')
+        if self.read_preference not in READ_PREFERENCES:
+            print(f"[MONGO WARNING] Preferencia de lectura '{self.read_preference}' inválida, se usa 'primary'")
+            self.read_preference = 'primary'
+    
+    def _available_compressors(self):
+        """Compresores configurados cuyo módulo está instalado"""
+        available = []
+        for name in filter(None, (c.strip() for c in self.compressors.split(','))):
+            try:
+                __import__(COMPRESSOR_MODULES[name])
+                available.append(name)
+            except (KeyError, ImportError):
+                print(f"[MONGO WARNING] Compresor '{name}' no disponible, se omite")
+        return available
+    
+    def _client_options(self):
+        options = {
+            "maxPoolSize": self.max_pool_size,
+            "minPoolSize": self.min_pool_size
+        }
+        if self.max_idle_time_ms:
+            options["maxIdleTimeMS"] = self.max_idle_time_ms
+        compressors = self._available_compressors()
+        if compressors:
+            options["compressors"] = ",".join(compressors)
+        return options
+    
+    def _write_concern(self):
+        w = int(self.write_concern) if str(self.write_concern).isdigit() else self.write_concern
+        return WriteConcern(w=w, j=self.write_journal)
         
-    def connect(self):
-        """Conecta a MongoDB Atlas de forma segura"""
+    def connect(self, retry=True):
+        """Conecta a MongoDB Atlas de forma segura
+        
+        Si el servidor no responde, el cliente queda creado y los heartbeats
+        de pymongo detectan cuando vuelve. Si ni siquiera se puede crear el
+        cliente (p. ej. falla la resolución DNS de mongodb+srv), se reintenta
+        en segundo plano con espera creciente.
+        """
         try:
             mongodb_uri = os.environ.get('MONGODB_URI')
             if not mongodb_uri:
                 print("[MONGO WARNING] MONGODB_URI no configurado")
                 return False
             
+            read_preference = READ_PREFERENCES[self.read_preference]()
+            self.monitor = TopologyMonitor(read_preference)
             self.client = MongoClient(
                 mongodb_uri,
                 serverSelectionTimeoutMS=5000,
                 connectTimeoutMS=10000,
-                socketTimeoutMS=10000
+                socketTimeoutMS=10000,
+                heartbeatFrequencyMS=self.heartbeat_ms,
+                event_listeners=[self.monitor],
+                **self._client_options()
             )
             
-            self.client.admin.command('ping')
-            
-            db_name = 'facenomad'
-            self.db = self.client[db_name]
+            self.db = self.client.get_database(self.db_name, write_concern=self._write_concern())
+            self.read_db = self.client.get_database(
+                self.db_name,
+                read_preference=read_preference
+            )
             self.connected = True
-            print(f"[MONGO INFO] Conectado exitosamente a MongoDB Atlas - DB: {db_name}")
+            
+            self.client.admin.command('ping')
+            print(f"[MONGO INFO] Conectado exitosamente a MongoDB Atlas - DB: {self.db_name}")
+            self._ensure_indexes()
             return True
             
         except (ConnectionFailure, ServerSelectionTimeoutError) as e:
-            print(f"[MONGO ERROR] No se pudo conectar a MongoDB: {e}")
-            self.connected = False
+            print(f"[MONGO ERROR] No se pudo conectar a MongoDB, se seguirá verificando en segundo plano: {e}")
             return False
         except Exception as e:
             print(f"[MONGO ERROR] Error inesperado: {e}")
             self.connected = False
+            if retry:
+                self._schedule_reconnect()
             return False
     
+    def _schedule_reconnect(self):
+        """Reintenta crear el cliente en segundo plano con espera exponencial"""
+        if self._reconnect_thread and self._reconnect_thread.is_alive():
+            return
+        
+        def reconnect():
+            delay = 5
+            while not self.connected:
+                time.sleep(delay)
+                if self.connect(retry=False):
+                    return
+                delay = min(delay * 2, self.reconnect_max_delay)
+        
+        self._reconnect_thread = threading.Thread(target=reconnect, daemon=True)
+        self._reconnect_thread.start()
+    
+    def _ensure_indexes(self):
+        """Crea los índices únicos en que se apoyan las sincronizaciones en bloque
+        
+        Si alguno falla, _indexes_ready queda en False y se reintenta desde
+        is_connected (como mucho una vez por minuto si el error no es de conexión).
+        """
+        indexes = [
+            ('workers', 'name', {}),
+            # Parcial: solo los id numéricos de IndexedDB ($exists también incluiría nulos)
+            ('attendance', 'client_id', {"partialFilterExpression": {"client_id": {"$type": "number"}}})
+        ]
+        
+        ready = True
+        for collection, field, options in indexes:
+            try:
+                self.db[collection].create_index(field, unique=True, **options)
+            except ConnectionFailure as e:
+                # Se vuelve a intentar cuando el servidor responda
+                ready = False
+                print(f"[MONGO WARNING] Índice {collection}.{field} pendiente: {e}")
+            except Exception as e:
+                ready = False
+                self._indexes_retry_at = time.time() + 60
+                print(f"[MONGO WARNING] No se pudo crear el índice único {collection}.{field}: {e}")
+        self._indexes_ready = ready
+    
+    @staticmethod
+    def _chunks(items, size):
+        """Agrupa un iterable en listas de hasta size elementos sin materializarlo"""
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    
     def disconnect(self):
         """Cierra la conexión a MongoDB"""
         if self.client:
             self.client.close()
             self.connected = False
+            self._indexes_ready = False
             print("[MONGO INFO] Conexión a MongoDB cerrada")
     
     def is_connected(self):
-        """Verifica si hay conexión activa"""
-        if not self.connected or not self.client:
-            return False
-        try:
-            self.client.admin.command('ping')
-            return True
-        except:
-            self.connected = False
+        """Verifica si hay un servidor que acepte escrituras según los heartbeats (sin ping)"""
+        if not self.connected or not self.client or not self.monitor.writable:
             return False
+        
+        # Si al conectar el servidor no respondía, los índices se crean al volver
+        if not self._indexes_ready and time.time() >= self._indexes_retry_at:
+            self._ensure_indexes()
+        return True
+    
+    def is_readable(self):
+        """Verifica si hay un servidor legible con la preferencia de lectura de read_db"""
+        return bool(self.connected and self.client and self.monitor.readable)
     
     def sync_workers(self, workers_data):
         """
@@ -79,30 +260,38 @@ class MongoService:
                 "errors": []
             }
             
+            operations = []
+            names = []
             for worker in workers_data:
+                if not worker.get('name'):
+                    results["errors"].append("Trabajador sin nombre omitido")
+                    continue
+                
+                worker_doc = {
+                    "name": worker.get('name'),
+                    "registered_at": worker.get('registered_at', datetime.utcnow().isoformat()),
+                    "photo_path": worker.get('photo_path'),
+                    "synced_at": datetime.utcnow().isoformat(),
+                    "status": "active"
+                }
+                operations.append(UpdateOne({"name": worker_doc["name"]}, {"$set": worker_doc}, upsert=True))
+                names.append(worker_doc["name"])
+            
+            # Un bulk_write desordenado por bloque: un error no detiene al resto
+            for start in range(0, len(operations), self.bulk_chunk_size):
+                chunk = operations[start:start + self.bulk_chunk_size]
                 try:
-                    worker_doc = {
-                        "name": worker.get('name'),
-                        "registered_at": worker.get('registered_at', datetime.utcnow().isoformat()),
-                        "photo_path": worker.get('photo_path'),
-                        "synced_at": datetime.utcnow().isoformat(),
-                        "status": "active"
-                    }
-                    
-                    existing = collection.find_one({"name": worker.get('name')})
-                    
-                    if existing:
-                        collection.update_one(
-                            {"name": worker.get('name')},
-                            {"$set": worker_doc}
-                        )
-                        results["updated"] += 1
-                    else:
-                        collection.insert_one(worker_doc)
-                        results["inserted"] += 1
-                        
-                except Exception as e:
-                    results["errors"].append(f"Error con {worker.get('name')}: {str(e)}")
+                    result = collection.bulk_write(chunk, ordered=False)
+                    details = result.bulk_api_result
+                except BulkWriteError as e:
+                    details = e.details
+                    # El índice de cada error es relativo al bloque
+                    for error in details.get("writeErrors", []):
+                        name = names[start + error["index"]]
+                        results["errors"].append(f"Error con {name}: {error.get('errmsg')}")
+                
+                results["inserted"] += details.get("nUpserted", 0)
+                results["updated"] += details.get("nMatched", 0)
             
             return {
                 "success": True,
@@ -117,6 +306,11 @@ class MongoService:
         """
         Sincroniza registros de asistencia a MongoDB
         Solo SUPERVISOR o ADMIN pueden ejecutar esto
+        Acepta una lista o un iterador: los registros se envían por bloques en
+        un bulk_write desordenado. Los que traen id de cliente se insertan con
+        un upsert $setOnInsert por client_id, así reenviarlos no los duplica
+        aunque el índice único no exista; los repetidos cuentan como ya
+        sincronizados
         """
         if not self.is_connected():
             return {"success": False, "message": "No hay conexión a MongoDB"}
@@ -125,11 +319,13 @@ class MongoService:
             collection = self.db['attendance']
             results = {
                 "inserted": 0,
+                "already_synced": 0,
                 "errors": []
             }
             
-            for record in attendance_data:
-                try:
+            for chunk in self._chunks(attendance_data, self.bulk_chunk_size):
+                operations = []
+                for record in chunk:
                     attendance_doc = {
                         "worker_name": record.get('workerName'),
                         "type": record.get('type'),
@@ -137,24 +333,35 @@ class MongoService:
                         "time": record.get('time'),
                         "timestamp": record.get('timestamp', datetime.utcnow().isoformat()),
                         "confidence": record.get('confidence'),
-                        "synced_at": datetime.utcnow().isoformat(),
-                        "client_id": record.get('id')
+                        "synced_at": datetime.utcnow().isoformat()
                     }
-                    
-                    existing = collection.find_one({
-                        "client_id": record.get('id')
-                    })
-                    
-                    if not existing:
-                        collection.insert_one(attendance_doc)
-                        results["inserted"] += 1
-                        
-                except Exception as e:
-                    results["errors"].append(f"Error con registro {record.get('id')}: {str(e)}")
+                    client_id = record.get('id')
+                    if client_id is None:
+                        operations.append(InsertOne(attendance_doc))
+                    else:
+                        attendance_doc["client_id"] = client_id
+                        operations.append(UpdateOne(
+                            {"client_id": client_id}, {"$setOnInsert": attendance_doc}, upsert=True
+                        ))
+                
+                try:
+                    details = collection.bulk_write(operations, ordered=False).bulk_api_result
+                except BulkWriteError as e:
+                    details = e.details
+                    for error in details.get("writeErrors", []):
+                        # Dos upserts simultáneos del mismo client_id chocan con el índice
+                        if error.get("code") == 11000:
+                            results["already_synced"] += 1
+                        else:
+                            record_id = chunk[error["index"]].get('id')
+                            results["errors"].append(f"Error con registro {record_id}: {error.get('errmsg')}")
+                
+                results["inserted"] += details.get("nInserted", 0) + details.get("nUpserted", 0)
+                results["already_synced"] += details.get("nMatched", 0)
             
             return {
                 "success": True,
-                "message": f"{results['inserted']} registros sincronizados",
+                "message": f"{results['inserted']} registros sincronizados, {results['already_synced']} ya estaban sincronizados",
                 "details": results
             }
             
@@ -163,11 +370,11 @@ class MongoService:
     
     def get_workers(self, limit=100):
         """Obtiene trabajadores desde MongoDB"""
-        if not self.is_connected():
+        if not self.is_readable():
             return {"success": False, "message": "No hay conexión a MongoDB"}
         
         try:
-            collection = self.db['workers']
+            collection = self.read_db['workers']
             workers = list(collection.find(
                 {"status": "active"},
                 {"_id": 0}
@@ -183,11 +390,11 @@ class MongoService:
     
     def get_attendance(self, worker_name=None, start_date=None, end_date=None, limit=500):
         """Obtiene registros de asistencia desde MongoDB"""
-        if not self.is_connected():
+        if not self.is_readable():
             return {"success": False, "message": "No hay conexión a MongoDB"}
         
         try:
-            collection = self.db['attendance']
+            collection = self.read_db['attendance']
             query = {}
             
             if worker_name:
@@ -0,0 +1,31 @@
+"""
+Pool de objetos de OpenCV que no son seguros entre hilos
+Cada hilo toma una instancia prestada y la devuelve al terminar, así las
+instancias se crean una sola vez y sobreviven a los hilos por conexión de
+app.run(threaded=True) en lugar de cargarse de nuevo en cada uno
+"""
+import queue
+from contextlib import contextmanager
+
+
+class ObjectPool:
+    """Instancias reutilizables creadas con factory cuando no hay una libre
+    
+    El pool crece hasta el número de hilos que las usan a la vez y nunca se
+    reduce: nadie comparte una instancia mientras la tiene prestada.
+    """
+    
+    def __init__(self, factory):
+        self.factory = factory
+        self._idle = queue.SimpleQueue()
+    
+    @contextmanager
+    def borrow(self):
+        try:
+            item = self._idle.get_nowait()
+        except queue.Empty:
+            item = self.factory()
+        try:
+            yield item
+        finally:
+            self._idle.put(item)
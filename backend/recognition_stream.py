@@ -0,0 +1,173 @@
+"""
+Canal WebSocket de reconocimiento continuo para kioscos
+El kiosco se autentica una sola vez al conectar y después envía cuadros
+JPEG binarios; el servidor responde con un evento por cada cuadro procesado
+"""
+import json
+import threading
+import time
+
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
+
+
+class FrameSlot:
+    """Último cuadro recibido que aún no se procesa
+    
+    Mientras se reconoce un cuadro, los que llegan reemplazan al pendiente:
+    el kiosco nunca acumula retraso, solo se descartan cuadros viejos.
+    """
+    
+    def __init__(self):
+        self.dropped = 0
+        self._frame = None
+        self._closed = False
+        self._condition = threading.Condition()
+    
+    def put(self, frame):
+        with self._condition:
+            if self._frame is not None:
+                self.dropped += 1
+            self._frame = frame
+            self._condition.notify()
+    
+    def take(self):
+        """Espera el siguiente cuadro; retorna None al cerrarse la sesión"""
+        with self._condition:
+            while self._frame is None and not self._closed:
+                self._condition.wait()
+            frame, self._frame = self._frame, None
+            return frame
+    
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+
+class RecognitionStream:
+    """Sesión de un kiosco: recibe cuadros y envía los resultados"""
+    
+    def __init__(self, ws, face_service, options, expires_at=None, deduper=None,
+                 kiosk_id=None, event_type=None):
+        self.ws = ws
+        self.face_service = face_service
+        self.options = options
+        self.expires_at = expires_at
+        # Ventana anti-rebote de asistencia del kiosco (opcional)
+        self.deduper = deduper
+        self.kiosk_id = kiosk_id
+        self.event_type = event_type
+        self.frames = 0
+        self.slot = FrameSlot()
+        # Los cuadros de la sesión se procesan en orden: un solo seguimiento
+        self.tracker = face_service.create_tracker()
+        self._send_lock = threading.Lock()
+    
+    def send(self, event):
+        with self._send_lock:
+            self.ws.send(json.dumps(event))
+    
+    def run(self, idle_timeout):
+        """Lee mensajes hasta que el cliente cierre o pase idle_timeout sin cuadros"""
+        worker = threading.Thread(target=self._process_frames, daemon=True)
+        worker.start()
+        
+        try:
+            while True:
+                message = self.ws.receive(timeout=idle_timeout)
+                if message is None:
+                    self.send({"type": "error", "message": "Sesión inactiva"})
+                    break
+                
+                if isinstance(message, (bytes, bytearray)):
+                    self.slot.put((self.frames, bytes(message), time.perf_counter()))
+                    self.frames += 1
+                    continue
+                
+                try:
+                    data = json.loads(message)
+                except ValueError:
+                    self.send({"type": "error", "message": "Mensaje inválido"})
+                    continue
+                
+                if data.get("type") == "ping":
+                    self.send({"type": "pong"})
+                elif data.get("type") == "close":
+                    break
+        finally:
+            self.slot.close()
+            worker.join()
+    
+    def _process_frames(self):
+        while True:
+            item = self.slot.take()
+            if item is None:
+                return
+            
+            if self.expires_at is not None and time.time() >= self.expires_at:
+                self.send({"type": "error", "message": "Token expirado"})
+                self.ws.close()
+                return
+            
+            sequence, frame, received_at = item
+            result = self.face_service.recognize_face(frame, tracker=self.tracker, **self.options)
+            if self.deduper is not None:
+                self.deduper.flag(result, self.kiosk_id, self.event_type)
+            result.update(
+                type="result",
+                frame=sequence,
+                dropped=self.slot.dropped,
+                latency_ms=round((time.perf_counter() - received_at) * 1000, 1)
+            )
+            try:
+                self.send(result)
+            except Exception:
+                # El cliente se desconectó; el lector cerrará la sesión
+                return
+
+
+def init_recognition_stream(app, face_service, authenticate, recognition_options, deduper=None):
+    """Registra /api/recognize/stream si flask-sock está instalado
+    
+    authenticate(token) retorna los claims del JWT o None; el primer mensaje
+    del cliente debe ser {"type": "auth", "token": ..., opciones...} y puede
+    incluir "kiosk_id" y "event_type" para la ventana anti-rebote.
+    """
+    if Sock is None:
+        print("[WARN] flask-sock no está instalado: reconocimiento por WebSocket desactivado")
+        return None
+    
+    sock = Sock(app)
+    
+    @sock.route('/api/recognize/stream')
+    def recognize_stream(ws):
+        """Reconocimiento continuo: autenticación única y cuadros binarios"""
+        try:
+            data = json.loads(ws.receive(timeout=app.config['FACE_STREAM_AUTH_TIMEOUT']) or "{}")
+        except ValueError:
+            data = {}
+        
+        claims = authenticate(data.get("token")) if data.get("type") == "auth" else None
+        if claims is None:
+            ws.send(json.dumps({"type": "error", "message": "Token de autenticación requerido"}))
+            ws.close()
+            return
+        
+        stream = RecognitionStream(
+            ws, face_service, recognition_options(data), claims.get("exp"),
+            deduper=deduper,
+            kiosk_id=data.get("kiosk_id") or claims.get("sub"),
+            event_type=data.get("event_type")
+        )
+        try:
+            stream.send({"type": "ready"})
+            stream.run(app.config['FACE_STREAM_IDLE_TIMEOUT'])
+        finally:
+            print(f"[INFO] Sesión de reconocimiento cerrada: {stream.frames} cuadros, "
+                  f"{stream.slot.dropped} descartados, {stream.tracker.predictions} predicciones, "
+                  f"{stream.tracker.reused} identidades reutilizadas")
+    
+    return sock
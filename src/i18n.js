@@ -22,6 +22,7 @@ const resources = {
         capture: 'Capturar',
         cancel: 'Cancelar',
         noFaceDetected: 'No se detectó ningún rostro',
+        duplicate: 'Este trabajador ya fue registrado hace un momento',
         processing: 'Procesando reconocimiento facial...'
       },
       register: {
@@ -105,6 +106,7 @@ const resources = {
         capture: 'Capture',
         cancel: 'Cancel',
         noFaceDetected: 'No face detected',
+        duplicate: 'This worker was already registered a moment ago',
         processing: 'Processing facial recognition...'
       },
       register: {
@@ -21,7 +21,7 @@ export default function CaptureScreen() {
     setProcessing(true);
     
     try {
-      const result = await api.recognizeFace(imageData);
+      const result = await api.recognizeFace(imageData, registrationType);
       
       if (!result.success) {
         setNotification({
@@ -51,6 +51,16 @@ export default function CaptureScreen() {
         return;
       }
       
+      if (result.duplicate) {
+        setNotification({
+          message: t('capture.duplicate'),
+          type: 'warning'
+        });
+        setProcessing(false);
+        setTimeout(() => navigate('/'), 2000);
+        return;
+      }
+      
       navigate('/validation', { 
         state: { 
           worker: {
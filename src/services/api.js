@@ -62,6 +62,31 @@ export const api = {
     return response.json();
   },
 
+  // Reconocimiento continuo por WebSocket: se autentica una vez y luego
+  // envía cada cuadro como Blob JPEG con stream.sendFrame(blob)
+  async openRecognitionStream(onEvent, options = {}) {
+    const token = await authService.getAccessToken();
+    const base = API_BASE_URL || window.location.origin;
+    const socket = new WebSocket(`${base.replace(/^http/, 'ws')}/api/recognize/stream`);
+    socket.binaryType = 'arraybuffer';
+    
+    socket.onopen = () => {
+      socket.send(JSON.stringify({ type: 'auth', token, ...options }));
+    };
+    socket.onmessage = (message) => onEvent(JSON.parse(message.data));
+    
+    return {
+      sendFrame(blob) {
+        if (socket.readyState === WebSocket.OPEN) {
+          socket.send(blob);
+        }
+      },
+      close() {
+        socket.close();
+      },
+    };
+  },
+
   async detectFace(base64Image) {
     const makeRequest = async () => {
       const headers = await getAuthHeaders();
@@ -76,13 +101,27 @@ export const api = {
     return handleResponse(response, makeRequest);
   },
 
-  async recognizeFace(base64Image) {
+  async recognizeFace(base64Image, eventType) {
     const makeRequest = async () => {
       const headers = await getAuthHeaders();
       return fetch(`${API_BASE_URL}/api/recognize`, {
         method: 'POST',
         headers,
-        body: JSON.stringify({ image: base64Image }),
+        body: JSON.stringify({ image: base64Image, event_type: eventType }),
+      });
+    };
+    
+    const response = await makeRequest();
+    return handleResponse(response, makeRequest);
+  },
+
+  async recognizeBatch(images) {
+    const makeRequest = async () => {
+      const headers = await getAuthHeaders();
+      return fetch(`${API_BASE_URL}/api/recognize/batch`, {
+        method: 'POST',
+        headers,
+        body: JSON.stringify({ images }),
       });
     };
     
@@ -117,6 +156,20 @@ export const api = {
     return handleResponse(response, makeRequest);
   },
 
+  async addWorkerSample(workerName, base64Image) {
+    const makeRequest = async () => {
+      const headers = await getAuthHeaders();
+      return fetch(`${API_BASE_URL}/api/workers/${encodeURIComponent(workerName)}/samples`, {
+        method: 'POST',
+        headers,
+        body: JSON.stringify({ image: base64Image }),
+      });
+    };
+    
+    const response = await makeRequest();
+    return handleResponse(response, makeRequest);
+  },
+
   async deleteWorker(workerName) {
     const makeRequest = async () => {
       const headers = await getAuthHeaders();
@@ -143,6 +196,16 @@ export const api = {
     return handleResponse(response, makeRequest);
   },
 
+  async getRetrainStatus(jobId) {
+    const makeRequest = async () => {
+      const headers = await getAuthHeaders();
+      return fetch(`${API_BASE_URL}/api/retrain/${encodeURIComponent(jobId)}`, { headers });
+    };
+    
+    const response = await makeRequest();
+    return handleResponse(response, makeRequest);
+  },
+
   // Gestión de usuarios
   async getUsers() {
     const makeRequest = async () => {
@@ -220,11 +283,15 @@ export const api = {
     return handleResponse(response, makeRequest);
   },
 
-  async syncDownload(since) {
+  async syncDownload(since, cursor) {
     const makeRequest = async () => {
       const headers = await getAuthHeaders();
-      const url = since 
-        ? `${API_BASE_URL}/api/sync/download?since=${encodeURIComponent(since)}`
+      const params = new URLSearchParams();
+      if (since) params.set('since', since);
+      if (cursor) params.set('cursor', cursor);
+      const query = params.toString();
+      const url = query
+        ? `${API_BASE_URL}/api/sync/download?${query}`
         : `${API_BASE_URL}/api/sync/download`;
       return fetch(url, { headers });
     };
@@ -54,9 +54,20 @@ export const syncService = {
   async downloadRecords() {
     try {
       const lastSync = await this.getLastSyncTime();
-      const result = await api.syncDownload(lastSync);
       
-      return result;
+      // El servidor entrega páginas; se siguen los cursores hasta el final
+      const records = [];
+      let cursor = null;
+      do {
+        const page = await api.syncDownload(lastSync, cursor);
+        if (!page.success) {
+          return page;
+        }
+        records.push(...page.records);
+        cursor = page.next_cursor;
+      } while (cursor);
+      
+      return { success: true, records, count: records.length };
     } catch (error) {
       console.error('Error al descargar registros:', error);
       throw error;